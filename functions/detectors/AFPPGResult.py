@@ -0,0 +1,108 @@
+import numpy as np
+
+# All AF_PPG_detector outputs in the order of the legacy output tuple
+OUTPUTS = ('outPPG', 'peakValArr', 'peakIndArr', 'sqi', 'det_pattern', 'out_pattern', 'corr_pattern')
+
+# Outputs that only change at detected beats and their storage types
+PIECEWISE_OUTPUTS = {'det_pattern': np.int8, 'out_pattern': np.float32, 'corr_pattern': np.float32, 'sqi': np.int8}
+
+
+class AFPPGResult:
+    """ Selected AF_PPG_detector outputs stored in typed numpy arrays.
+
+    Only the requested outputs are kept, the others are None. Filtered PPG
+    is stored as float32, peak values as float64 and peak indexes as int64.
+    The per-sample outputs sqi, det_pattern (int8), out_pattern and
+    corr_pattern (float32) only change at detected beats and are kept as
+    runs of equal values. With run_length=False they are also expanded to
+    arrays as long as the signal, otherwise they can be accessed with
+    get_runs(), expand(), mean() and at() without a per-sample array.
+    """
+    def __init__(self, n_samples, outputs=OUTPUTS, run_length=False):
+        unknown = [name for name in outputs if name not in OUTPUTS]
+        if unknown:
+            raise ValueError(f'Unknown AF_PPG_detector outputs {unknown}, expected some of {OUTPUTS}')
+
+        self.n_samples = n_samples
+        self.outputs = tuple(outputs)
+        self.run_length = run_length
+        self.runs = {}
+        for name in OUTPUTS:
+            setattr(self, name, None)
+
+    @classmethod
+    def from_detector(cls, outPPG, peakValArr, peakIndArr, runStarts, runValues, outputs=OUTPUTS, run_length=False,
+                      n_samples=None):
+        # runStarts - sample indexes where the piecewise outputs get new values,
+        # runValues - their (det_pattern, out_pattern, corr_pattern, sqi) values,
+        # outPPG can be None if it is not requested (n_samples is then required)
+        result = cls(len(outPPG) if n_samples is None else n_samples, outputs, run_length)
+
+        if 'outPPG' in result.outputs:
+            result.outPPG = np.asarray(outPPG, dtype=np.float32)
+        if 'peakValArr' in result.outputs:
+            result.peakValArr = np.asarray(peakValArr, dtype=np.float64)
+        if 'peakIndArr' in result.outputs:
+            result.peakIndArr = np.asarray(peakIndArr, dtype=np.int64)
+
+        starts = np.asarray(runStarts, dtype=np.int64)
+        lengths = np.diff(np.append(starts, result.n_samples))
+        values = np.asarray(runValues, dtype=np.float64).reshape(len(starts), len(PIECEWISE_OUTPUTS))
+        for i, (name, dtype) in enumerate(PIECEWISE_OUTPUTS.items()):
+            if name in result.outputs:
+                result._set_runs(name, starts, lengths, values[:, i].astype(dtype))
+        return result
+
+    def _set_runs(self, name, starts, lengths, values):
+        # Drop empty runs and merge neighbouring runs with equal values
+        non_empty = lengths > 0
+        starts = starts[non_empty]
+        values = values[non_empty]
+        new_value = np.ones(len(values), dtype=bool)
+        new_value[1:] = values[1:] != values[:-1]
+
+        self.runs[name] = (starts[new_value], values[new_value])
+        if not self.run_length:
+            setattr(self, name, self.expand(name))
+
+    def get_runs(self, name):
+        # Run start indexes and values of a piecewise output
+        if name not in self.runs:
+            raise KeyError(f'Output {name} was not requested')
+        return self.runs[name]
+
+    def get_run_lengths(self, name):
+        starts, _ = self.get_runs(name)
+        return np.diff(np.append(starts, self.n_samples))
+
+    def expand(self, name):
+        # Per-sample array of a piecewise output
+        _, values = self.get_runs(name)
+        return np.repeat(values, self.get_run_lengths(name))
+
+    def at(self, name, indexes):
+        # Values of a piecewise output at sample indexes
+        starts, values = self.get_runs(name)
+        indexes = np.asarray(indexes, dtype=np.int64)
+        indexes = np.where(indexes < 0, indexes + self.n_samples, indexes)
+        if np.any((indexes < 0) | (indexes >= self.n_samples)):
+            raise IndexError(f'Sample index out of range for {self.n_samples} samples')
+        return values[np.searchsorted(starts, indexes, side='right') - 1]
+
+    def mean(self, name, start=None, stop=None):
+        # Mean of a piecewise output over samples[start:stop] (nan if empty)
+        starts, values = self.get_runs(name)
+        samples = range(self.n_samples)[start:stop]
+        if len(samples) == 0:
+            return np.nan
+
+        # Length of every run inside the sample range
+        run_stops = np.append(starts[1:], self.n_samples)
+        overlap = np.minimum(run_stops, samples.stop) - np.maximum(starts, samples.start)
+        overlap = np.maximum(overlap, 0)
+        if np.issubdtype(values.dtype, np.integer):
+            total = np.sum(values.astype(np.int64) * overlap)
+        else:
+            total = np.sum(values.astype(np.float64) * overlap)
+        return total / len(samples)
+
@@ -21,4 +21,43 @@ class CrossCorrelation:
         if self.is_equal_length:
             # normalizing like MATLAB's xcorr 'biased' option
             ccf /= self.sig_length
-        return ccf
\ No newline at end of file
+        return ccf
+
+    def get_peak(self):
+        # Largest positive CCF value and its lag (first one on ties),
+        # 0 and the first lag if the CCF has no positive values
+        ccf = self.get_ccf()
+        max_idx = np.argmax(ccf)
+        if ccf[max_idx] > 0:
+            return ccf[max_idx], self.lags[max_idx]
+        return 0, self.lags[0]
+
+
+class LagWindowCrossCorrelation(CrossCorrelation):
+    """ Cross-correlation restricted to lags -max_lag ... max_lag (samples).
+
+    Values at the computed lags are the same as CrossCorrelation values at
+    those lags, lags outside the window are not computed.
+    """
+    def __init__(self, sig1, sig2, max_lag):
+        sig1 = np.asarray(sig1, dtype=float)
+        sig2 = np.asarray(sig2, dtype=float)
+        n1 = len(sig1)
+        n2 = len(sig2)
+
+        lag_min = max(-max_lag, -n1 + 1)
+        lag_max = min(max_lag, n2 - 1)
+        self.lags = np.arange(lag_min, lag_max + 1)
+
+        # CCF at lag l is sum(sig1[j] * sig2[j + s]) with offset s = n2 - n1 - l
+        s_min = n2 - n1 - lag_max
+        s_max = n2 - n1 - lag_min
+        sig2_padded = np.zeros(s_max - s_min + n1)
+        start = max(s_min, 0)
+        stop = min(s_max + n1, n2)
+        sig2_padded[start - s_min:stop - s_min] = sig2[start:stop]
+
+        self.conv = np.correlate(sig2_padded, sig1, mode='valid')[::-1]
+        self.corr_length = n1 + n2 - 1
+        self.is_equal_length = n1 == n2
+        self.sig_length = n1 if self.is_equal_length else 0
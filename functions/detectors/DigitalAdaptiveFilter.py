@@ -1,3 +1,7 @@
+import numpy as np
+from scipy.signal import lfilter
+
+
 class DigitalAdaptiveFilter:
     def __init__(self):
         self.a = 0.0001
@@ -8,12 +12,16 @@ class DigitalAdaptiveFilter:
         self.y = 0.0
         self.norm = 0.0
         self.flag = True
+        # Prediction of the next block and its (mu, M, ref), kept by process_block
+        self.yNext = None
+        self.yNextKey = None
 
     def NLMS(self, mu, M, d, ref):
         if self.flag:
             self.w = [0.0] * M
             self.x = [0.0] * M
             self.flag = False
+        self.yNext = None
 
         self.y = self.w[0] * ref
 
@@ -34,4 +42,51 @@ class DigitalAdaptiveFilter:
             self.x[self.i] = self.x[self.i - 1]
         self.x[0] = ref
 
-        return self.e
\ No newline at end of file
+        return self.e
+
+    def process_block(self, mu, M, d, ref):
+        # NLMS over an array of desired samples d with reference ref (scalar
+        # or array), returns the array of errors
+        d = np.asarray(d, dtype=float)
+        ref = np.broadcast_to(np.asarray(ref, dtype=float), d.shape)
+        e = np.empty_like(d)
+        if len(d) == 0:
+            return e
+
+        if not np.all(ref == ref[0]):
+            # General reference: sample by sample update
+            for n in range(len(d)):
+                e[n] = self.NLMS(mu, M, d[n], ref[n])
+            return e
+
+        # Constant reference r: warm-up until the regressor is filled with r
+        r = float(ref[0])
+        n = 0
+        while n < len(d) and (self.flag or any(xi != r for xi in self.x)):
+            e[n] = self.NLMS(mu, M, d[n], r)
+            n += 1
+        if n == len(d):
+            return e
+
+        # With x = [r, ..., r] every weight gets the same update, so the
+        # filter output y = r * sum(w) follows y += k * (d - y)
+        k = M * mu * r * r / (M * r * r + self.a)
+        # Consecutive blocks continue the recursion state exactly
+        if self.yNext is not None and self.yNextKey == (mu, M, r):
+            y_start = self.yNext
+        else:
+            y_start = r * sum(self.w)
+        y_pred, zf = lfilter([0.0, k], [1.0, -(1.0 - k)], d[n:], zi=[y_start])
+        e[n:] = d[n:] - y_pred
+
+        # Keep the filter state consistent with the block
+        if r != 0:
+            delta = (zf[0] - y_start) / (r * M)
+            self.w = [wi + delta for wi in self.w]
+        self.y = y_pred[-1]
+        self.e = e[-1]
+        self.norm = (M * r * r) ** 0.5
+        self.yNext = zf[0]
+        self.yNextKey = (mu, M, r)
+
+        return e
@@ -1,3 +1,7 @@
+import numpy as np
+from scipy.signal import lfilter, lfiltic
+
+
 class DigitalFilter:
     def __init__(self):
         self.xIIR = None
@@ -5,29 +9,45 @@ class DigitalFilter:
         self.LIIRb = 0
         self.LIIRa = 0
         self.flagIIR = True
+        # Filter state (lfilter conditions) and its coefficients
+        self.ziIIR = None
+        self.ziCoeffs = None
+
+    def _init_state(self, b_coeff, a_coeff, shape=()):
+        self.xIIR = np.zeros(shape + (len(b_coeff),))
+        self.yIIR = np.zeros(shape + (len(a_coeff),))
+        self.LIIRb = len(b_coeff) - 1
+        self.LIIRa = len(a_coeff) - 1
+        self.flagIIR = False
 
     def IIRFilter(self, input_val, b_coeff, a_coeff):
+        # One sample of process_block, so sample and block calls share the
+        # same arithmetic and state
+        return float(self.process_block([input_val], b_coeff, a_coeff)[0])
+
+    def process_block(self, input_arr, b_coeff, a_coeff):
+        # Filter array (or arrays along the last axis) continuing from the
+        # previous IIRFilter / process_block calls
+        input_arr = np.asarray(input_arr, dtype=float)
         if self.flagIIR:
-            self.xIIR = [0.0] * len(b_coeff)
-            self.yIIR = [0.0] * len(a_coeff)
-            self.LIIRb = len(b_coeff) - 1
-            self.LIIRa = len(a_coeff) - 1
-            self.flagIIR = False
-
-        # Calculate new output:
-        output_iir = input_val * b_coeff[0]
-        for i in range(self.LIIRb):
-            output_iir += self.xIIR[i] * b_coeff[i + 1]
-        for i in range(self.LIIRa):
-            output_iir -= self.yIIR[i] * a_coeff[i + 1]
-
-        # Update:
-        for i in range(self.LIIRa, 0, -1):
-            self.yIIR[i] = self.yIIR[i - 1]
-        self.yIIR[0] = output_iir
-
-        for i in range(self.LIIRb, 0, -1):
-            self.xIIR[i] = self.xIIR[i - 1]
-        self.xIIR[0] = input_val
-
-        return output_iir
\ No newline at end of file
+            self._init_state(b_coeff, a_coeff, input_arr.shape[:-1])
+        if input_arr.shape[-1] == 0:
+            # (lfilter returns zero conditions for an empty input)
+            return input_arr.copy()
+
+        coeffs = (tuple(b_coeff), tuple(a_coeff))
+        if self.ziIIR is None or self.ziCoeffs != coeffs:
+            # Initial conditions from the past inputs and outputs (newest
+            # first), also when the coefficients change
+            zi = [lfiltic(b_coeff, a_coeff, y[:self.LIIRa], x[:self.LIIRb])
+                  for x, y in zip(self.xIIR.reshape(-1, self.xIIR.shape[-1]), self.yIIR.reshape(-1, self.yIIR.shape[-1]))]
+            self.ziIIR = np.reshape(zi, self.xIIR.shape[:-1] + (-1,))
+            self.ziCoeffs = coeffs
+
+        output_arr, self.ziIIR = lfilter(b_coeff, a_coeff, input_arr, axis=-1, zi=self.ziIIR)
+
+        # Keep the newest inputs and outputs (newest first) for a change of coefficients
+        self.xIIR = np.concatenate((input_arr[..., ::-1], self.xIIR), axis=-1)[..., :self.LIIRb + 1]
+        self.yIIR = np.concatenate((output_arr[..., ::-1], self.yIIR), axis=-1)[..., :self.LIIRa + 1]
+
+        return output_arr
@@ -1,4 +1,7 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from SlidingOrderStatistic import SlidingOrderStatistic
 
 
 class MedianFilter:
@@ -6,16 +9,36 @@ class MedianFilter:
         self.in_buffer = None
         self.flag = True
 
+    def _init_buffer(self, med_filt_ord):
+        # Running window of the last med_filt_ord inputs, starts filled with 0.0001
+        self.in_buffer = SlidingOrderStatistic(med_filt_ord, 0.0001)
+        self.flag = False
+
     def median_filter(self, input_value, med_filt_ord):
         if self.flag:
-            self.in_buffer = [0.0001] * med_filt_ord
-            self.flag = False
+            self._init_buffer(med_filt_ord)
+
+        # Replace the oldest element of the window and update the median
+        self.in_buffer.push(input_value)
+
+        return self.in_buffer.median()
+
+    def filter_block(self, array, med_filt_ord):
+        # Medians of consecutive median_filter calls for all array values
+        if self.flag:
+            self._init_buffer(med_filt_ord)
+
+        array = np.asarray(array, dtype=float)
+        if len(array) == 0:
+            return array
+        history = list(self.in_buffer.ring_buffer)[1:]
+        windows = sliding_window_view(np.concatenate((history, array)), len(history) + 1)
+        output = np.median(windows, axis=-1)
 
-        # Shift the buffer and update the last element
-        self.in_buffer[:-1] = self.in_buffer[1:]
-        self.in_buffer[-1] = input_value
+        for input_value in array[-(len(history) + 1):]:
+            self.in_buffer.push(float(input_value))
 
-        return self.calculate_median(self.in_buffer)
+        return output
 
     @staticmethod
     def calculate_median(array):
@@ -25,4 +48,20 @@ class MedianFilter:
         if length % 2 == 0:
             return (sorted_array[(length // 2) - 1] + sorted_array[length // 2]) / 2
         else:
-            return sorted_array[length // 2]
\ No newline at end of file
+            return sorted_array[length // 2]
+
+    @staticmethod
+    def window_median(array, before, after):
+        # Median of array[i - before:i + after] (truncated at the array ends)
+        # for every sample i
+        array = np.asarray(array, dtype=float)
+        if len(array) == 0:
+            return array
+        padded = np.concatenate((np.full(before, np.nan), array, np.full(after - 1, np.nan)))
+        windows = sliding_window_view(padded, before + after)
+        medians = np.nanmedian(windows, axis=-1)
+
+        # Windows with missing values have no median (as np.median)
+        isnan = np.concatenate((np.zeros(before, dtype=bool), np.isnan(array), np.zeros(after - 1, dtype=bool)))
+        medians[np.any(sliding_window_view(isnan, before + after), axis=-1)] = np.nan
+        return medians
@@ -0,0 +1,54 @@
+import numpy as np
+
+from DigitalFilter import DigitalFilter
+from DigitalAdaptiveFilter import DigitalAdaptiveFilter
+
+# LP filter coefficients
+B_LP = [3.649246226465329e-04, 0.001459698490586, 0.002189547735879, 0.001459698490586, 3.649246226465329e-04]
+A_LP = [1.0, -3.419753240513017, 4.526774177988911, -2.738063526698766, 0.637227353478029]
+
+# HP filter coefficients
+B_HP = [0.930170138647645, -1.860340277295290, 0.930170138647645]
+A_HP = [1.0, -1.970251633832550, 0.970893103812223]
+
+
+class PPGFrontEnd:
+    """ Block version of the AF_PPG_detector filtering chain.
+
+    Runs the HP and LP IIR stages and the NLMS baseline wander removal
+    (constant reference 1) over whole arrays. The filter states are kept
+    between calls, so consecutive blocks give the same output as one call
+    over the concatenated signal. With channels > 1 the blocks are
+    (channels, samples) arrays and all channels are filtered together.
+
+    The IIR stages run DigitalFilter.process_block, identical to the
+    per-sample DigitalFilter.IIRFilter. The NLMS stage runs
+    DigitalAdaptiveFilter.process_block, which evaluates the constant
+    reference update as a first-order recursion and matches the per-sample
+    DigitalAdaptiveFilter.NLMS to floating point rounding only (relative
+    difference below 1e-9 of the signal range).
+    """
+    def __init__(self, mu=0.015, M=5, channels=1):
+        self.mu = mu
+        self.M = M
+        self.channels = channels
+        self.mDigitalFilterHP = DigitalFilter()
+        self.mDigitalFilterLP = DigitalFilter()
+        self.mDigitalAdaptiveFilters = [DigitalAdaptiveFilter() for _ in range(channels)]
+
+    def process(self, x):
+        x = np.asarray(x, dtype=float)
+        x_2d = x.reshape(self.channels, -1)
+
+        # Processing with IIR High-pass filter
+        y = self.mDigitalFilterHP.process_block(x_2d, B_HP, A_HP)
+        # Processing with IIR Low-pass filter
+        y = self.mDigitalFilterLP.process_block(y, B_LP, A_LP)
+        # Perform baseline wander removal using NLMS adaptive filter
+        return self._nlms(y).reshape(x.shape)
+
+    def _nlms(self, d):
+        e = np.empty_like(d)
+        for ch, mDigitalAdaptiveFilter in enumerate(self.mDigitalAdaptiveFilters):
+            e[ch] = mDigitalAdaptiveFilter.process_block(self.mu, self.M, d[ch], 1)
+        return e
@@ -0,0 +1,67 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import resample
+
+# directories
+script_path = os.path.dirname(os.path.realpath(__file__))
+TEMPLATE_PATH = script_path + '/assets/template_Type1_Dawber_55_250.txt'
+
+# Number of resampled templates kept in memory (pulse lengths in samples)
+TEMPLATE_CACHE_SIZE = 512
+
+
+def resample_template(template, pulseSize):
+    """ Resample template to pulse length and normalize by mean and standard deviation.
+
+    Parameters
+    ----------
+    template : np.array
+        PPG pulse template.
+    pulseSize : int
+        Number of samples of the current PPG pulse.
+
+    Returns
+    -------
+    template_resampled : np.array
+        Resampled, z-normalized template.
+    """
+    template_resampled = resample(template, pulseSize)
+    return (template_resampled - np.mean(template_resampled)) / np.std(template_resampled)
+
+
+@lru_cache(maxsize=1)
+def load_ppg_template():
+    """ Load the reference PPG template once per process.
+
+    Returns
+    -------
+    template : np.array
+        Read-only reference template scaled as in AF_PPG_detector.
+    """
+    with open(TEMPLATE_PATH) as f:
+        contents = f.readlines()
+
+    template = np.fix(np.array(contents, dtype=float) * 20)
+    template.setflags(write=False)
+    return template
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def get_ppg_template(pulseSize):
+    """ Get the reference template resampled to pulse length.
+
+    Parameters
+    ----------
+    pulseSize : int
+        Number of samples of the current PPG pulse.
+
+    Returns
+    -------
+    template_resampled : np.array
+        Read-only resampled, z-normalized reference template (shared between calls).
+    """
+    template_resampled = resample_template(load_ppg_template(), pulseSize)
+    template_resampled.setflags(write=False)
+    return template_resampled
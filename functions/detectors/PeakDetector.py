@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class PeakDetector:
     def __init__(self):
         self.sampleNo = -1
@@ -43,4 +46,139 @@ class PeakDetector:
                 self.tempMax = 0
                 self.prevMaxIdx = self.maxIdx
 
-        return self.peakIdx
\ No newline at end of file
+        return self.peakIdx
+
+    def process_block(self, y, Fs, numbness, threshold, on_peak):
+        # Block version of threshold_crossing_peak_detector continuing from
+        # the detector state. threshold is per-sample (or constant), numbness
+        # is a callable returning the current value (read when a peak is
+        # checked). on_peak(i, peakIdx) is called for the outputs with
+        # peakIdx[0] 1 or 2 (later outputs repeat the same peak); it may
+        # change numbness for the following samples.
+        y = np.asarray(y, dtype=float)
+        threshold = np.broadcast_to(np.asarray(threshold, dtype=float), y.shape)
+
+        # The first samples of the stream only fill the window
+        start = 0
+        while start < len(y) and self.sampleNo < 2:
+            self.threshold_crossing_peak_detector(float(y[start]), Fs, numbness(), threshold[start])
+            start += 1
+        n_samples = len(y) - start
+        if n_samples == 0:
+            return
+
+        # Three-sample window of every sample, continuing the window state
+        window = np.concatenate((self.inputArr, y[start:]))
+        left = window[1:-2]
+        mid = window[2:-1]
+        right = window[3:]
+        sampleNo = self.sampleNo + 1
+
+        above = mid > threshold[start:]
+        below = ~above
+        candidate = above & (mid > left) & (mid > right)
+        # The first two samples of every run below threshold (the outputs of
+        # a new peak and the resets of the peak search)
+        first_below = below & np.concatenate(([True], above[:-1]))
+        second_below = below & np.concatenate(([False], first_below[:-1]))
+        above_count = np.cumsum(above)
+        below_count = np.cumsum(below)
+
+        tempMax = self.tempMax
+        maxIdx = self.maxIdx
+        maxVal = self.maxVal
+        prevMaxIdx = self.prevMaxIdx
+        # cnt and counter are counted from the last reset
+        cnt_start = -self.cnt
+        counter_start = -self.counter
+        mid_list = mid.tolist()
+
+        for k in np.flatnonzero(candidate | first_below | second_below).tolist():
+            if above[k]:
+                if mid_list[k] > tempMax:
+                    tempMax = mid_list[k]
+                    if above_count[k] - cnt_start >= (0.06 * Fs):
+                        cnt_start = above_count[k]
+                        difference = sampleNo + k - prevMaxIdx
+                        if difference > (numbness() * Fs) or difference == sampleNo + k:
+                            maxIdx = sampleNo + k
+                            maxVal = mid_list[k]
+                            counter_start = below_count[k]
+            elif maxIdx != 0:
+                counter = int(below_count[k] - counter_start)
+                tempMax = 0
+                prevMaxIdx = maxIdx
+                if counter <= 2:
+                    on_peak(start + k, [counter, maxIdx, maxVal])
+
+        self.sampleNo += n_samples
+        self.inputArr = window[-3:].tolist()
+        self.tempMax = tempMax
+        self.maxIdx = maxIdx
+        self.maxVal = maxVal
+        self.prevMaxIdx = prevMaxIdx
+        self.cnt = int(above_count[-1] - cnt_start)
+        self.peakIdx = [0.0] * 3
+        if maxIdx != 0:
+            self.counter = int(below_count[-1] - counter_start)
+            if below[-1]:
+                self.peakIdx = [self.counter, maxIdx, maxVal]
+
+    @staticmethod
+    def threshold_crossing_peaks(y, Fs, numbness, threshold):
+        # Batch version of threshold_crossing_peak_detector for a whole signal
+        # (from the initial detector state). numbness and threshold are the
+        # per-sample (or constant) values passed to the sample detector.
+        # Returns indexes and values of the confirmed peaks (outputs with
+        # peakIdx[0] == 1) and the sample indexes where they were confirmed.
+        y = np.asarray(y, dtype=float)
+        n_samples = len(y)
+        numbness = np.broadcast_to(np.asarray(numbness, dtype=float), y.shape)
+        threshold = np.broadcast_to(np.asarray(threshold, dtype=float), y.shape)
+        if n_samples < 4:
+            return np.array([], dtype=int), np.array([]), np.array([], dtype=int)
+
+        # Three-sample window of every sample from sampleNo 3 on; the first two
+        # windows come from the initial filling of the window ([y1, y2, y0])
+        left = np.concatenate(([y[2], y[0]], y[3:-2]))[:n_samples - 3]
+        mid = np.concatenate(([y[0]], y[3:-1]))
+        right = y[3:]
+        sampleNo = np.arange(3, n_samples)
+
+        above = mid > threshold[3:]
+        candidate = above & (mid > left) & (mid > right)
+        # Samples below threshold right after samples above it, the first of
+        # the detector outputs for the current maximum
+        run_end = ~above & np.concatenate(([False], above[:-1]))
+        # Number of samples above threshold up to (including) every sample
+        above_count = np.cumsum(above)
+
+        tempMax = 0
+        maxIdx = 0
+        maxVal = 0
+        prevMaxIdx = 0
+        cnt_start = 0
+        confirmed = False
+        peakInd, peakVal, confirmInd = [], [], []
+
+        for k in np.flatnonzero(candidate | run_end):
+            if candidate[k]:
+                if mid[k] > tempMax:
+                    tempMax = mid[k]
+                    if above_count[k] - cnt_start >= (0.06 * Fs):
+                        cnt_start = above_count[k]
+                        difference = sampleNo[k] - prevMaxIdx
+                        if difference > (numbness[sampleNo[k]] * Fs) or difference == sampleNo[k]:
+                            maxIdx = sampleNo[k]
+                            maxVal = mid[k]
+                            confirmed = True
+            elif maxIdx != 0:
+                if confirmed:
+                    peakInd.append(maxIdx)
+                    peakVal.append(maxVal)
+                    confirmInd.append(sampleNo[k])
+                    confirmed = False
+                tempMax = 0
+                prevMaxIdx = maxIdx
+
+        return np.array(peakInd, dtype=int), np.array(peakVal), np.array(confirmInd, dtype=int)
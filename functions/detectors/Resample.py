@@ -1,26 +1,24 @@
+import numpy as np
+
+
 class Resample:
     def byte_to_short(self, data, length, reduce_stereo):
+        # View 16-bit little-endian samples of the byte buffer (no copy)
+        short_data = np.frombuffer(data, dtype='<u2')
         if reduce_stereo:
-            short_data = []
-            for i in range(0, len(data), 4):
-                val1 = (data[i + 1] << 8) | data[i]
-                val2 = (data[i + 3] << 8) | data[i + 2]
-                short_data.append(((val1 + val2) // 2) & 0xFFFF)  # Ensure 16-bit overflow
-            return short_data
+            channels = short_data.reshape(-1, 2).astype(np.uint32)
+            return ((channels[:, 0] + channels[:, 1]) // 2).astype(np.uint16)  # Ensure 16-bit overflow
         else:
-            return [((data[i + 1] << 8) | data[i]) & 0xFFFF for i in range(0, len(data), 2)]
+            return short_data
 
     def short_to_byte(self, data, length, expand_mono):
-        byte_data = bytearray()
+        # Lowest 16 bits of every value, little-endian (wraps around as val & 0xFFFF)
+        short_data = np.asarray(data, dtype=np.int64).astype('<u2')
 
         if expand_mono:
-            for val in data:
-                byte_data.extend([val & 0xFF, (val >> 8) & 0xFF, val & 0xFF, (val >> 8) & 0xFF])
-        else:
-            for val in data:
-                byte_data.extend([val & 0xFF, (val >> 8) & 0xFF])
+            short_data = np.repeat(short_data, 2)
 
-        return byte_data
+        return bytearray(short_data.tobytes())
 
     def convert(self, data, length, in_stereo, out_stereo, in_frequency, out_frequency):
         if in_stereo == out_stereo and in_frequency == out_frequency:
@@ -42,99 +40,59 @@ class Resample:
             return self.trim_array(data, length)
 
         scale = in_frequency / out_frequency
-        pos = 0.0
-        output = []
+        data = np.asarray(data, dtype=float)
 
         if not stereo:
-            for _ in range(int(length / scale)):
-                in_pos = int(pos)
-                proportion = pos - in_pos
-
-                if in_pos >= length - 1:
-                    in_pos = length - 2
-                    proportion = 1.0
-
-                output.append(round(data[in_pos] * (1.0 - proportion) + data[in_pos + 1] * proportion))
-                pos += scale
+            channels = data.reshape(-1, 1)
+            n_out = int(length / scale)
+            last_pos = length - 1
         else:
-            for _ in range(int((length / 2) / scale)):
-                in_pos = int(pos)
-                proportion = pos - in_pos
+            channels = data[:len(data) - len(data) % 2].reshape(-1, 2)
+            n_out = int((length / 2) / scale)
+            last_pos = (length - 3 + 1) // 2
 
-                in_real_pos = in_pos * 2
-                if in_real_pos >= length - 3:
-                    in_real_pos = length - 4
-                    proportion = 1.0
+        # Input positions accumulated as pos += scale
+        pos = np.cumsum(np.append(0.0, np.full(max(n_out - 1, 0), scale)))[:n_out]
+        in_pos = pos.astype(int)
+        proportion = pos - in_pos
 
-                output.extend([
-                    round(data[in_real_pos] * (1.0 - proportion) + data[in_real_pos + 2] * proportion),
-                    round(data[in_real_pos + 1] * (1.0 - proportion) + data[in_real_pos + 3] * proportion)
-                ])
-                pos += scale
+        end = in_pos >= last_pos
+        in_pos[end] = last_pos - 1
+        proportion[end] = 1.0
 
-        return output
+        output = np.rint(channels[in_pos] * (1.0 - proportion[:, None]) + channels[in_pos + 1] * proportion[:, None])
+        return output.astype(np.int64).ravel()
 
     def downsample(self, data, length, stereo, in_frequency, out_frequency):
         if in_frequency == out_frequency:
             return self.trim_array(data, length)
 
         scale = out_frequency / in_frequency
-        output = []
-        pos = 0.0
-        out_pos = 0
+        data = np.asarray(data, dtype=float)
 
         if not stereo:
-            sum_val = 0.0
-            output = [0] * int(length * scale)
-            in_pos = 0
-            while out_pos < len(output):
-                this_val = data[in_pos]
-                in_pos += 1
-                next_pos = pos + scale
-                if next_pos >= 1.0:
-                    sum_val += this_val * (1.0 - pos)
-                    output[out_pos] = round(sum_val)
-                    out_pos += 1
-                    next_pos -= 1.0
-                    sum_val = next_pos * this_val
-                else:
-                    sum_val += scale * this_val
-                pos = next_pos
-
-                if in_pos >= length and out_pos < len(output):
-                    output[out_pos] = round(sum_val / pos)
-                    out_pos += 1
+            channels = data[:length].reshape(-1, 1)
+            n_out = int(length * scale)
         else:
-            sum1 = 0.0
-            sum2 = 0.0
-            output = [0] * (2 * int(length / 2 * scale))
-            in_pos = 0
-            while out_pos < len(output):
-                this_val1 = data[in_pos]
-                this_val2 = data[in_pos + 1]
-                next_pos = pos + scale
-                if next_pos >= 1.0:
-                    sum1 += this_val1 * (1.0 - pos)
-                    sum2 += this_val2 * (1.0 - pos)
-                    output[out_pos] = round(sum1)
-                    output[out_pos + 1] = round(sum2)
-                    next_pos -= 1.0
-                    sum1 = next_pos * this_val1
-                    sum2 = next_pos * this_val2
-                else:
-                    sum1 += scale * this_val1
-                    sum2 += scale * this_val2
-                pos = next_pos
-
-                if in_pos >= length and out_pos < len(output):
-                    output[out_pos] = round(sum1 / pos)
-                    output[out_pos + 1] = round(sum2 / pos)
-                    out_pos += 2
-
-        return output
+            channels = data[:length - length % 2].reshape(-1, 2)
+            n_out = int(length / 2 * scale)
+        n_in = len(channels)
+        if n_out == 0 or n_in == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Every output sample is the mean of the input over its interval,
+        # taken from the running integral of the piecewise constant input
+        integral = np.concatenate((np.zeros((1, channels.shape[1])), np.cumsum(channels, axis=0)))
+        edges = np.arange(n_out + 1) / scale
+        edge_idx = np.minimum(np.floor(edges).astype(int), n_in)
+        edge_frac = np.where(edge_idx < n_in, edges - edge_idx, 0.0)
+        edge_integral = integral[edge_idx] + channels[np.minimum(edge_idx, n_in - 1)] * edge_frac[:, None]
+
+        output = np.rint(np.diff(edge_integral, axis=0) * scale)
+        return output.astype(np.int64).ravel()
 
     def trim_array(self, data, length):
         if len(data) == length:
             return data
         else:
-            return data[:length]
\ No newline at end of file
+            return data[:length]
@@ -0,0 +1,72 @@
+import numpy as np
+
+from func_count_matches import func_count_matches
+
+# Rows of the feature window
+RAW, MED, RAW_DIV_MED, MED_DIV_MED, RAW_DIFF, RAW_DIFF_MED = range(6)
+
+
+class RhythmFeatures:
+    """ Interval features of the last beats used by AF_PPG_detector.
+
+    Keeps the raw, median filtered, ratio and difference interval features
+    of the last `window` beats in a preallocated ring buffer. Every value is
+    written twice (at position p and p + window), so the window is always a
+    contiguous view and no values are shifted when a beat is added. Until the
+    window is filled, beats are written from the start of the window, the
+    remaining positions stay zero.
+    """
+    def __init__(self, window=8):
+        self.window = window
+        self.buffer = np.zeros((6, 2 * window))
+        self.start = 0
+        self.count = 0
+
+    def push(self, raw, med, rawDivMed, medDivMed, rawDiff, rawDiffMed):
+        if self.count < self.window:
+            pos = self.count
+        else:
+            # Drop the oldest beat, the new one takes the last position
+            self.start = (self.start + 1) % self.window
+            pos = (self.start + self.window - 1) % self.window
+        self.count += 1
+
+        values = (raw, med, rawDivMed, medDivMed, rawDiff, rawDiffMed)
+        self.buffer[:, pos] = values
+        self.buffer[:, pos + self.window] = values
+
+    def get_window(self):
+        # Features of the window, array of shape (6, window), oldest beat first
+        return self.buffer[:, self.start:self.start + self.window]
+
+    def reset_tail(self, start):
+        # Set features of window positions start ... window - 1 to zero
+        pos = (self.start + np.arange(start, self.window)) % self.window
+        self.buffer[:, pos] = 0
+        self.buffer[:, pos + self.window] = 0
+
+    def cross_count(self):
+        # Number of sign changes of the raw interval differences
+        rising = np.diff(self.get_window()[RAW]) > 0
+        return np.count_nonzero(rising[1:] != rising[:-1])
+
+    def triple_sign_count(self, limit=0.15):
+        # Number of three consecutive beats whose raw and median filtered
+        # interval differences both exceed +-limit
+        window = self.get_window()
+        rawDiff = window[RAW_DIFF]
+        rawDiffMed = window[RAW_DIFF_MED]
+        large = ((rawDiff > limit) & (rawDiffMed > limit)) | ((rawDiff < -limit) & (rawDiffMed < -limit))
+        return np.count_nonzero(large[:-2] & large[1:-1] & large[2:])
+
+    def match_index(self, r=0.03):
+        window = self.get_window()
+        return func_count_matches(window[MED], window[RAW_DIFF_MED], self.window, r)
+
+    def rms_ratio(self):
+        # Squared relative difference of the sums of median filtered and raw
+        # interval ratios (summed in beat order)
+        window = self.get_window()
+        rmSum = np.cumsum(np.append(0.0001, window[MED_DIV_MED]))[-1]
+        rSum = np.cumsum(np.append(0.0001, window[RAW_DIV_MED]))[-1]
+        return ((rmSum / rSum) - 1) ** 2
@@ -0,0 +1,85 @@
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class SlidingOrderStatistic:
+    """ Order statistics of the last `size` values of a stream.
+
+    The window is kept twice: in arrival order (ring buffer) to know which
+    value leaves the window and sorted to answer order statistic queries.
+    Insert and evict find their position by binary search (O(log n)
+    comparisons) but shift the list elements behind it, so a new value costs
+    O(n) time, done as one memory move and without re-sorting the window.
+    For the detector windows (a few hundred samples) this is faster than a
+    logarithmic tree structure in Python.
+    """
+    def __init__(self, size, initial_value=None):
+        self.size = size
+        self.ring_buffer = deque()
+        self.sorted_buffer = []
+
+        # Optionally start with a window filled with initial_value
+        if initial_value is not None:
+            self.ring_buffer.extend([initial_value] * size)
+            self.sorted_buffer = [initial_value] * size
+
+    def __len__(self):
+        return len(self.ring_buffer)
+
+    def push(self, value):
+        # Evict the oldest value of the full window
+        if len(self.ring_buffer) == self.size:
+            oldest = self.ring_buffer.popleft()
+            del self.sorted_buffer[bisect_left(self.sorted_buffer, oldest)]
+
+        self.ring_buffer.append(value)
+        insort(self.sorted_buffer, value)
+
+    def extend(self, values):
+        # Push all values (the window is rebuilt if they fill it)
+        values = np.asarray(values, dtype=float)
+        if len(values) >= self.size:
+            self.ring_buffer = deque(values[-self.size:].tolist())
+            self.sorted_buffer = sorted(self.ring_buffer)
+        else:
+            for value in values.tolist():
+                self.push(value)
+
+    def percentile_after(self, values, ends, q):
+        # percentile(q) of the window after pushing values[:end], for every
+        # end of ends (the window itself is not changed)
+        values = np.asarray(values, dtype=float)
+        history = np.concatenate((np.asarray(self.ring_buffer, dtype=float), values))
+        stops = len(self.ring_buffer) + np.asarray(ends, dtype=np.int64)
+        starts = np.maximum(stops - self.size, 0)
+        result = np.empty(len(stops))
+
+        full = stops - starts == self.size
+        if np.any(full):
+            k = max(int(self.size * q) - 1, 0)
+            windows = sliding_window_view(history, self.size)[starts[full]]
+            result[full] = np.partition(windows, k, axis=1)[:, k]
+        for i in np.flatnonzero(~full):
+            window = history[starts[i]:stops[i]]
+            k = max(int(len(window) * q) - 1, 0)
+            result[i] = np.partition(window, k)[k]
+        return result
+
+    def kth(self, k):
+        # k-th smallest value of the window (0 - minimum)
+        return self.sorted_buffer[k]
+
+    def percentile(self, q):
+        # Value at index int(n * q) - 1 of the sorted window, q in (0, 1]
+        return self.sorted_buffer[max(int(len(self.sorted_buffer) * q) - 1, 0)]
+
+    def median(self):
+        length = len(self.sorted_buffer)
+
+        if length % 2 == 0:
+            return (self.sorted_buffer[(length // 2) - 1] + self.sorted_buffer[length // 2]) / 2
+        else:
+            return self.sorted_buffer[length // 2]
@@ -1,16 +1,17 @@
+import numpy as np
+
+
 def func_count_matches(rrInt, rrIntDiff, windowLength, r):
-    differences = 0
-    for i in range(windowLength - 1):
-        for j in range(i + 1, windowLength):
-            if abs(rrIntDiff[i]) < 0.40 and abs(rrIntDiff[i]) > 0.008:
-            # if abs(rrIntDiff[i]) < 0.80 and abs(rrIntDiff[i]) > 0.004:
-                # if rrInt[i] != 0 and rrInt[j] != 0:
-                if abs(rrInt[i] - rrInt[j]) > r:
-                    differences += 1
-                # end
-            # else:
-            #     differences = 0
+    rrInt = np.asarray(rrInt[:windowLength], dtype=float)
+    rrIntDiff = np.asarray(rrIntDiff[:windowLength], dtype=float)
+
+    # Pairs i < j whose intervals differ by more than r, counted only for
+    # rows i with a moderate interval difference
+    validDiff = (np.abs(rrIntDiff) < 0.40) & (np.abs(rrIntDiff) > 0.008)
+    # validDiff = (np.abs(rrIntDiff) < 0.80) & (np.abs(rrIntDiff) > 0.004)
+    pairDiff = np.abs(rrInt[:, None] - rrInt[None, :]) > r
+    differences = np.count_nonzero(np.triu(pairDiff, k=1)[validDiff])
 
     diffInd = differences / (windowLength * (windowLength - 1) / 2)
     # diffInd = (9/256) * differences
-    return diffInd
\ No newline at end of file
+    return diffInd
@@ -28,23 +28,25 @@ def extract_best_quality_ppg(ppg_segment, metadata, ind_ppg_rec):
     # directories
     work_dir = '../'
     sys.path.insert(1,work_dir + '/app/functions/detectors')
-    from AF_PPG_detector import AF_PPG_detector
+    from AF_PPG_detector import AF_PPG_detector_multichannel
     
     ppg_signals = [ppg_segment[x] for x in ppg_segment.keys() if 'ppg' in x]
     sqis = []
     sqis_perc = []
-    for n_sig in ppg_signals:
-        outPPG, peakValArr, peakIndArr, sqi, det_pattern, out_pattern, corr_pattern = AF_PPG_detector(np.array(n_sig), metadata['ppg_fs'])
-        sqi_recovery = sqi[ind_ppg_rec:]
-        sqis.append(np.round(np.sum(sqi_recovery)/len(sqi_recovery),3))
+    # all PPG signals are processed by the detector in a single pass,
+    # only peaks and run-length encoded SQI are kept
+    results = AF_PPG_detector_multichannel(np.array(ppg_signals), metadata['ppg_fs'],
+                                           outputs = ('peakIndArr', 'sqi'), run_length = True)
+    for result in results:
+        sqis.append(np.round(result.mean('sqi', ind_ppg_rec),3))
     
     ## get best quality signal
-    signal_to_analyse = ppg_signals[np.argmax(sqis)]
     sqi_quality = sqis[np.argmax(sqis)]
     
-    outPPG_n, peakValArr_n, peakIndArr_n, sqi_n, det_pattern_n, out_pattern_n, corr_pattern_n = AF_PPG_detector(np.array(signal_to_analyse), metadata['ppg_fs'])
+    result_n = results[np.argmax(sqis)]
+    peakIndArr_n = result_n.peakIndArr
     
-    sqi_arr = np.array(sqi_n)[peakIndArr_n]
+    sqi_arr = result_n.at('sqi', peakIndArr_n)
     sqi_arr_shift = sqi_arr * np.roll(sqi_arr, -1)
     ind_arr = np.array(peakIndArr_n)[np.array(sqi_arr_shift).astype(bool)]
     return sqi_quality, ind_arr
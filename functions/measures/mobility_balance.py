@@ -118,9 +118,7 @@ def evaluate_acc_balance(acc_segment, metadata):
     ##
     from acceleration_preprocess import acceleration_preprocess, acceleration_magnitude
     
-    Acc_m_seg = acceleration_preprocess(np.array(acc_segment['y']), metadata)
-    Acc_v_seg = acceleration_preprocess(np.array(acc_segment['x']), metadata)
-    Acc_a_seg = acceleration_preprocess(np.array(acc_segment['z']), metadata)
+    Acc_m_seg, Acc_v_seg, Acc_a_seg = acceleration_preprocess(np.array(acc_segment[['y','x','z']]), metadata).T
     
     ## Evaluate postural sway
     points = [[x,y] for x,y in zip(Acc_a_seg, Acc_m_seg)]
@@ -151,7 +149,7 @@ def evaluate_acc_balance(acc_segment, metadata):
     
 
 
-def evaluate_mobility_balance(acc, df_walking_bouts_updated, metadata):
+def evaluate_mobility_balance(acc, df_walking_bouts_updated, metadata, context = None):
     """ Evaluate mobility and balance measures.
     
     Parameters
@@ -162,6 +160,8 @@ def evaluate_mobility_balance(acc, df_walking_bouts_updated, metadata):
         dataframe of walking bouts information
     metadata : dict
         metadata of signal.
+    context : RecordingContext
+        Preprocessed signals of the recording (default - created from acc).
         
     Returns
     -------
@@ -171,10 +171,12 @@ def evaluate_mobility_balance(acc, df_walking_bouts_updated, metadata):
     # directories
     work_dir = '../'
     sys.path.insert(1,work_dir + '/app/functions/preprocess')
-    from PA_algorithms import step_detection_TAF, calc_mad
-    from acceleration_preprocess import acceleration_preprocess, acceleration_magnitude, rotate_acceleration_axis, butter_lowpass_filter
+    from recording_context import RecordingContext
     ##
     
+    if context is None:
+        context = RecordingContext(acc, metadata)
+    
     process = 0
     if len(df_walking_bouts_updated) > 0:
         process = 1
@@ -182,6 +184,8 @@ def evaluate_mobility_balance(acc, df_walking_bouts_updated, metadata):
     df_mobility_balance = pd.DataFrame([])
     dict_save = {key: metadata[key] for key in ['sub_id','filename']}
     
+    timeline = context.activity_timeline()
+    
     ## Extract parameters    
     for df_wb in df_walking_bouts_updated.iterrows():
         df_wb_dat = df_wb[1]
@@ -191,15 +195,8 @@ def evaluate_mobility_balance(acc, df_walking_bouts_updated, metadata):
         acc_segment = acc.iloc[int(df_wb_dat['ind_start']):int(df_wb_dat['ind_end'])]
         acc_walking = acc_segment.iloc[metadata['acc_fs']*metadata['rest_time']:int((metadata['acc_fs']*metadata['rest_time'])+df_wb_dat['duration']*metadata['acc_fs'])]
         
-        # Rotate 
-        acc_original_axis = acc[['x','y','z']]
-        rotated_acc = rotate_acceleration_axis(acc_original_axis)
-        
-        ## Calculate magnitude of mediolateral acceleration axis signal
-        acc_mod_or = np.sqrt(np.sum(np.square(rotated_acc[['x']]), axis=1))
-        acc_mod = np.array(acc_mod_or - np.mean(acc_mod_or))
-        acc_mod_filt = butter_lowpass_filter(acc_mod, 3, 50, 5)
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod_filt, metadata['acc_fs'], max_val = 50, min_val = 0)
+        ## Calculate magnitude of mediolateral acceleration axis signal (rotated)
+        steps_arr, time_array, steps_min, num_arr = timeline.step_detection('rotated_x_abs', max_val = 50, filt = (3, 50, 5))
         
         ## Evaluate distance made during walking
         xmin_walk_test = distance_walk_test(steps_min, steps_arr, metadata)
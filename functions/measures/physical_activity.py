@@ -4,7 +4,7 @@ import numpy as np
 import sys
 from scipy import signal
 
-def evaluate_physical_activity(acc, metadata):
+def evaluate_physical_activity(acc, metadata, context = None):
     """ Evaluate physical activity measures.
 
     Parameters
@@ -13,6 +13,8 @@ def evaluate_physical_activity(acc, metadata):
         acceleration dataframe.
     metadata : dict
         metadata of signal.
+    context : RecordingContext
+        Preprocessed signals of the recording (default - created from acc).
 
     Returns
     -------
@@ -22,12 +24,10 @@ def evaluate_physical_activity(acc, metadata):
     # directories
     work_dir = '../'
     sys.path.insert(1,work_dir + '/app/functions/preprocess')
-    from PA_algorithms import step_detection_TAF
-    from utils import ranges
-    from acceleration_preprocess import acceleration_preprocess, acceleration_magnitude, rotate_acceleration_axis, butter_lowpass_filter
+    from recording_context import RecordingContext
     
-    acc_original_axis = acc[['x','y','z']]
-    rotated_acc = rotate_acceleration_axis(acc_original_axis)
+    if context is None:
+        context = RecordingContext(acc, metadata)
     
     position_configuration = 0
     if metadata['position'] == 'wrist':
@@ -37,17 +37,16 @@ def evaluate_physical_activity(acc, metadata):
     else:
         position_configuration = 0
         
+    timeline = context.activity_timeline()
     if position_configuration == 0 or position_configuration == 1:
-        acc_mod_or = rotated_acc['x']
-        acc_mod = np.array(acc_mod_or - np.mean(acc_mod_or))
-        acc_mod_filt = butter_lowpass_filter(acc_mod, 3, metadata['acc_fs'], 5)
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod_filt, metadata['acc_fs'], max_val = 50, min_val = 0)     # fs_oh1, max_val = 100, min_val = 0
+        acc_mod_name = 'rotated_x'
     
     if position_configuration == 2:
-        acc_mod_or = acceleration_magnitude([rotated_acc['x'], rotated_acc['y'], rotated_acc['z']])
-        acc_mod = (np.array(acc_mod_or - np.mean(acc_mod_or)))
-        acc_mod_filt = butter_lowpass_filter(acc_mod, 3, metadata['acc_fs'], 5)
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod_filt, metadata['acc_fs'], max_val = 50, min_val = 0)   # , max_val = 150, min_val = 0
+        acc_mod_name = 'rotated'
+    
+    # steps of low-pass filtered magnitude
+    filt = (3, metadata['acc_fs'], 5)
+    steps_min = timeline.steps_min(acc_mod_name, max_val = 50, filt = filt)     # fs_oh1, max_val = 100, min_val = 0
     
     step_count = np.sum(steps_min)
     active_minutes =  len(np.where(steps_min>metadata['active_minute_steps'])[0])
@@ -55,10 +54,7 @@ def evaluate_physical_activity(acc, metadata):
     total_minutes = len(steps_min)
     
     # Walking bouts
-    walking_minutes = steps_min.copy()
-    walking_minutes[walking_minutes<metadata['active_minute_steps']+1] = 0
-    walking_minutes[walking_minutes>metadata['active_minute_steps']] = 1
-    ranges_walking_bouts = ranges(np.where(walking_minutes==1)[0])
+    ranges_walking_bouts = timeline.active_ranges(acc_mod_name, max_val = 50, filt = filt, min_steps = metadata['active_minute_steps'])
     durations_walking_bouts = [(x[1]-x[0])+1 for x in ranges_walking_bouts]
     
     if len(durations_walking_bouts) > 0: # if any walking bouts detected
@@ -5,6 +5,112 @@ import os.path
 from os import path
 import numpy as np
 
+def detect_steps(acc_mod, fs, max_val = 150):
+    """Detect steps as midpoints between threshold crossings.
+
+    Parameters
+    ----------
+    acc_mod : np.array
+        acceleration magnitude signal.
+    fs : int
+        Sampling rate of acceleartion signal.
+    max_val : int
+        Maximal value threshold for step detection.
+
+    Returns
+    -------
+    steps : np.array
+        Indexes of detected steps (first element is always 0).
+    """
+    acc_mod = np.asarray(acc_mod)
+    width = int(round(fs/8))
+    lim_step = int(round(fs/4))
+    
+    # Signal is above threshold from a sample over max_val until a sample
+    # under max_val (samples equal to max_val keep the previous state)
+    above = acc_mod > max_val
+    changes = above | (acc_mod < max_val)
+    last_change = np.maximum.accumulate(np.where(changes, np.arange(len(acc_mod)), 0))
+    state = above[last_change]
+    prev_state = np.concatenate(([above[0]], state[:-1]))
+    rises = np.flatnonzero(state & ~prev_state)
+    n_falls = np.count_nonzero(~state & prev_state)
+    
+    # Every fall checks the distance between the last two rises before it
+    # (rises list starts as [0, 1])
+    inds = np.concatenate(([0, 1], rises))
+    n_rises_before = np.arange(n_falls) + (0 if above[0] else 1)
+    start = inds[n_rises_before]
+    distance = inds[n_rises_before + 1] - start
+    candidates = (distance / 2 + start)[distance > width]
+    
+    # Steps closer than lim_step to the previous step are skipped
+    steps = [0]
+    if len(candidates) > 0:
+        next_candidate = np.searchsorted(candidates, candidates + lim_step, side='right')
+        i_c = 0
+        while i_c < len(candidates):
+            steps.append(candidates[i_c])
+            i_c = next_candidate[i_c]
+    return np.array(steps)
+
+
+def steps_per_epoch(steps_arr, n_samples, fs, sec = 60):
+    """Count steps in consecutive time intervals.
+
+    Parameters
+    ----------
+    steps_arr : np.array
+        Sorted indexes of detected steps.
+    n_samples : int
+        Length of acceleration signal.
+    fs : int
+        Sampling rate of acceleartion signal.
+    sec : int
+        Duration of time interval in seconds.
+
+    Returns
+    -------
+    time_array : np.array
+        Start time of every interval in seconds.
+    num : np.array
+        Number of steps in every interval (interval ends are inclusive).
+    """
+    part_dur = sec*fs
+    n_parts = int(n_samples/part_dur)
+    if n_parts == 0:
+        return np.array([]), np.array([])
+    
+    index_st = np.arange(n_parts)*part_dur
+    index_en = np.arange(1, n_parts+1)*part_dur
+    num = np.searchsorted(steps_arr, index_en, side='right') - np.searchsorted(steps_arr, index_st, side='left')
+    time_array = index_st/fs
+    return time_array, num
+
+
+def activity_intensity(num, prop = 1):
+    """Classify physical activity intensity from steps per interval.
+
+    Parameters
+    ----------
+    num : np.array
+        Number of steps in every interval.
+    prop : float
+        Number of intervals in one minute.
+
+    Returns
+    -------
+    num_arr : np.array
+        Physical activity intensity (0 - no physical acivity, 1 - light, 2 - medium, 3 - heavy).
+    """
+    num_arr = np.array(num)
+    num_arr[num_arr<(60/prop)] = 0
+    num_arr[(num_arr>(59/prop)) & (num_arr<(100/prop))] = 1
+    num_arr[(num_arr>(99/prop)) & (num_arr<(130/prop))] = 2
+    num_arr[num_arr>(129/prop)] = 3
+    return num_arr
+
+
 def step_detection_TAF(acc_mod, fs, max_val = 150, min_val = 0):
     """Steps detection in acceleration signal.
 
@@ -31,63 +137,22 @@ def step_detection_TAF(acc_mod, fs, max_val = 150, min_val = 0):
         Indicates physical activity intensity (0 - no physical acivity, 1 - light, 1 - medium, 3 - heavy).
     """
     ##### 
-
-    width = int(round(fs/8))
-    lim_step = int(round(fs/4))
-    inds = [0,1]
-    low = 0
-    if acc_mod [0] > max_val:
-        low = 1
-    
-    steps = [0]
-    steps_amp = []
     
-    for i_n in range(len(acc_mod)):
-        if low:
-            if acc_mod[i_n] < max_val:
-                low = 0
-                if (inds[-1]-inds[-2]) > width:
-                    ind_step = ((inds[-1]-inds[-2])/2)+inds[-2]
-                    if len(steps) > 1:
-                        if (ind_step - steps[-1]) >lim_step:
-                            steps.append(ind_step)
-                            steps_amp.append(np.max(acc_mod[inds[-2]:inds[-1]])) 
-                    else:
-                        steps.append(ind_step)
-                        steps_amp.append(np.max(acc_mod[inds[-2]:inds[-1]])) 
-        else:
-            if acc_mod[i_n] > max_val:
-                inds.append(i_n)
-                low = 1
+    steps = detect_steps(acc_mod, fs, max_val)
+    steps_arr = pd.Series(steps)
     
-    steps_arr = pd.Series(np.array(steps))
     sec = 60
     prop = 60/sec
-    part_dur = sec*fs
-    n_parts = int(len(acc_mod)/part_dur)
-    
-    num = []
-    time = []
-    
-    for i in range(0,n_parts):
-        index_st = i*part_dur
-        index_en = (i+1)*part_dur
-        time.append(index_st/fs)
-        num.append(np.sum(steps_arr.between(index_st, index_en)))
+    time_array, num = steps_per_epoch(steps, len(acc_mod), fs, sec)
         
     # Estimate physical intensities
     steps_min = np.array(num)*prop
-    num_arr = np.array(num)
-    num_arr[num_arr<(60/prop)] = 0
-    num_arr[(num_arr>(59/prop)) & (num_arr<(100/prop))] = 1
-    num_arr[(num_arr>(99/prop)) & (num_arr<(130/prop))] = 2
-    num_arr[num_arr>(129/prop)] = 3
+    num_arr = activity_intensity(num, prop)
     
-    time_array = np.array(time)
     return steps_arr, time_array, steps_min, num_arr
 
 
-def calc_mad(acc, fs):
+def calc_mad(acc, fs, out = None, dtype = np.float64):
     """Calculate mean amplitude deviation.
 
     Parameters
@@ -96,6 +161,11 @@ def calc_mad(acc, fs):
         Acceleration magnitude signal.
     fs : int
         Sampling rate of acceleartion signal.
+    out : np.array
+        Optional buffer for mads (length - number of whole seconds).
+    dtype : np.dtype
+        Data type of calculation (e.g. np.float32, np.dtype('float32') or
+        'float32').
 
     Returns
     -------
@@ -104,13 +174,78 @@ def calc_mad(acc, fs):
     mean_mads : float
         Average of mean amplitude deviation.
     """
-    acc = [x/980.665 for x in acc]
-    mads = []
-    for i in range(int(np.floor(len(acc)/fs))):
-        sec = acc[fs*i:fs*i+fs]
-        mad1 = [np.abs(x-np.mean(sec)) for x in sec]
-        mad = np.sum(mad1)/len(sec)
-        mads.append(mad)
-        mean_mad = np.mean(mads)
+    n_sec = int(np.floor(len(acc)/fs))
+    
+    # One row per second (incomplete last second is dropped)
+    sec = np.asarray(acc[:n_sec*fs], dtype=dtype).reshape(n_sec, fs)/np.dtype(dtype).type(980.665)
+    mad1 = np.abs(sec - np.mean(sec, axis=1, keepdims=True))
+    mads = np.divide(np.sum(mad1, axis=1), fs, out=out)
+    
+    mean_mad = np.mean(mads) if n_sec > 0 else np.nan
     return mads, mean_mad
 
+
+class MadIndex(object):
+    """Mean amplitude deviation of every second with its cumulative sums.
+
+    Sum and mean of MAD between two times are answered in O(1).
+    """
+    def __init__(self, acc, fs, dtype = np.float64):
+        """
+        Parameters
+        ----------
+        acc : np.array
+            Acceleration magnitude signal.
+        fs : int
+            Sampling rate of acceleartion signal.
+        dtype : np.dtype
+            Data type of MAD calculation.
+        """
+        self.fs = fs
+        self.mads, self.mean_mad = calc_mad(acc, fs, dtype = dtype)
+        self.cumsum = np.concatenate(([0.0], np.cumsum(self.mads, dtype=float)))
+
+    def _seconds(self, t0, t1):
+        # whole seconds as slicing mads[int(t0):int(t1)]
+        n = len(self.mads)
+        s0 = np.clip(np.asarray(t0, dtype=float).astype(int), 0, n)
+        s1 = np.clip(np.asarray(t1, dtype=float).astype(int), 0, n)
+        return s0, np.maximum(s1, s0)
+
+    def sum(self, t0, t1):
+        """Sum of MAD of seconds t0 ... t1 - 1.
+
+        Parameters
+        ----------
+        t0 : float or np.array
+            Start time in seconds.
+        t1 : float or np.array
+            End time in seconds (not included).
+
+        Returns
+        -------
+        mad_sum : float or np.array
+            Sum of MAD.
+        """
+        s0, s1 = self._seconds(t0, t1)
+        return self.cumsum[s1] - self.cumsum[s0]
+
+    def mean(self, t0, t1):
+        """Mean MAD of seconds t0 ... t1 - 1 (nan if there are none).
+
+        Parameters
+        ----------
+        t0 : float or np.array
+            Start time in seconds.
+        t1 : float or np.array
+            End time in seconds (not included).
+
+        Returns
+        -------
+        mad_mean : float or np.array
+            Mean of MAD.
+        """
+        s0, s1 = self._seconds(t0, t1)
+        count = s1 - s0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 0, (self.cumsum[s1] - self.cumsum[s0]) / np.maximum(count, 1), np.nan)[()]
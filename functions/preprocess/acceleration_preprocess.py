@@ -1,11 +1,11 @@
 import sys
+import warnings
 import pandas as pd
 from scipy import signal
 import os.path
 from os import path
 import numpy as np
-from scipy.spatial.transform import Rotation as R
-from scipy.signal import butter,filtfilt
+from filter_bank import butter_filtfilt
 
 def acceleration_preprocess(acceleration_axis, metadata):
     """ Preprocess acceleration signal.
@@ -13,23 +13,23 @@ def acceleration_preprocess(acceleration_axis, metadata):
     Parameters
     ----------
     acceleration_axis : np.array
-        Acceleration signal of one axis.
+        Acceleration signal of one axis, or of several axes (array of shape (N, k)).
     metadata : dict
         metadata of signal.
 
     Returns
     -------
     acceleration_axis_filt : np.array
-        Filtered acceleration signal.
+        Filtered acceleration signal(s).
     """
-    b, a = signal.butter(N=4, Wn=0.1, btype="highpass", fs=metadata['acc_fs'])
-    acceleration_axis_filt = signal.filtfilt(b, a, acceleration_axis)
+    # Butterworth high-pass filter
+    acceleration_axis_filt = butter_filtfilt(acceleration_axis, 4, 0.1, metadata['acc_fs'], 'high')
 
     N_sav_gol = int(metadata['acc_fs']/5)
     if (N_sav_gol % 2) == 0:
         N_sav_gol = N_sav_gol + 1
     # Savitzky-Golay filter
-    acceleration_axis_filt = signal.savgol_filter(acceleration_axis_filt, N_sav_gol, 2)/1000
+    acceleration_axis_filt = signal.savgol_filter(acceleration_axis_filt, N_sav_gol, 2, axis=0)/1000
     
     return acceleration_axis_filt
 
@@ -78,45 +78,264 @@ def rotation_matrix_from_vectors(vec1, vec2):
     return rotation_matrix
 
 
-def rotate_acceleration_axis(acc):
+def rotation_matrices_from_vectors(vec1, vecs2):
+    """ Create rotation matrices for many vectors at once.
+
+    Parameters
+    ----------
+    vec1 : np.array
+        reference vector.
+    vecs2 : np.array
+        vectors to rotate, array of shape (N, 3).
+    Returns
+    -------
+    rotation_matrices: np.array
+        Rotation matrices (as rotation_matrix_from_vectors), array of shape (N, 3, 3).
+    """
+    
+    a = (np.asarray(vec1, dtype=float) / np.linalg.norm(vec1)).reshape(3)
+    b = np.asarray(vecs2, dtype=float)
+    b = b / np.linalg.norm(b, axis=1)[:, None]
+    v = np.cross(a, b)
+    c = b @ a
+    s = np.linalg.norm(v, axis=1)
+    
+    # skew-symmetric cross product matrices
+    kmat = np.zeros((len(b), 3, 3))
+    kmat[:, 0, 1], kmat[:, 0, 2] = -v[:, 2], v[:, 1]
+    kmat[:, 1, 0], kmat[:, 1, 2] = v[:, 2], -v[:, 0]
+    kmat[:, 2, 0], kmat[:, 2, 1] = -v[:, 1], v[:, 0]
+    
+    rotation_matrices = np.eye(3) + kmat + np.einsum('nij,njk->nik', kmat, kmat) * ((1 - c) / (s ** 2))[:, None, None]
+    return rotation_matrices
+
+
+def window_medians(values, indexes, window, min_periods, chunk = 1024):
+    """ Centered rolling median evaluated only at selected samples.
+
+    Parameters
+    ----------
+    values : np.array
+        Signal values, array of shape (N, k).
+    indexes : np.array
+        Samples at which median is evaluated.
+    window : int
+        Rolling window length (as pd.DataFrame.rolling(window, center=True)).
+    min_periods : int
+        Minimal number of valid values in window.
+    chunk : int
+        Maximal number of windows gathered at once (memory is limited to
+        chunk * window * k values).
+
+    Returns
+    -------
+    medians : np.array
+        Medians at the selected samples, array of shape (len(indexes), k).
+    """
+    values = np.asarray(values, dtype=float)
+    indexes = np.asarray(indexes, dtype=int)
+    medians = np.full((len(indexes), values.shape[1]), np.nan)
+    
+    # window of sample i covers samples i - window//2 ... i + (window-1)//2
+    offsets = np.arange(window) - window // 2
+    for start in range(0, len(indexes), chunk):
+        positions = indexes[start:start + chunk, None] + offsets
+        inside = (positions >= 0) & (positions < len(values))
+        windows = values[np.clip(positions, 0, len(values) - 1)]
+        windows[~inside] = np.nan
+        
+        chunk_medians = medians[start:start + chunk]
+        valid = ~np.isnan(windows)
+        full = np.all(valid, axis=(1, 2))
+        chunk_medians[full] = np.median(windows[full], axis=1)
+        
+        # truncated windows (edges, missing values)
+        if not np.all(full):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                partial = np.nanmedian(windows[~full], axis=1)
+            partial[np.sum(valid[~full], axis=1) < min_periods] = np.nan
+            chunk_medians[~full] = partial
+    return medians
+
+
+def sliding_median(values, window, min_periods = None, block = None):
+    """ Centered rolling median of every column.
+
+    Exact medians are pd.DataFrame(values).rolling(window, center=True,
+    min_periods=min_periods).median().values, the pandas sliding-window
+    median (skiplist, O(log window) per sample) which is faster than numpy
+    window gathering and needs no per-window memory.
+
+    Parameters
+    ----------
+    values : np.array
+        Signal values, array of shape (N, k).
+    window : int
+        Rolling window length.
+    min_periods : int
+        Minimal number of valid values in window (default - window).
+    block : int
+        Approximate block-median mode, medians are evaluated every block
+        samples and linearly interpolated (default - None, exact medians).
+
+    Returns
+    -------
+    medians : np.array
+        Rolling medians, array of shape (N, k).
+    """
+    values = np.asarray(values, dtype=float)
+    if min_periods is None:
+        min_periods = window
+    n = len(values)
+    
+    if block is not None and block > 1:
+        # medians of windows centered at block samples
+        centers = np.append(np.arange(0, n - 1, block), n - 1) if n > 1 else np.arange(n)
+        center_medians = window_medians(values, centers, window, min_periods)
+        return np.column_stack([np.interp(np.arange(n), centers, column) for column in center_medians.T])
+    
+    return pd.DataFrame(values).rolling(window, center=True, min_periods=min_periods).median().values
+
+
+def slerp_rotation_matrices(knots, knot_matrices, times):
+    """ Spherical linear interpolation of rotation matrices.
+
+    Parameters
+    ----------
+    knots : np.array
+        Increasing sample indexes of the known rotations.
+    knot_matrices : np.array
+        Rotation matrices at knots, array of shape (K, 3, 3). Knots with
+        non-finite matrices are skipped (interpolated over).
+    times : np.array
+        Samples at which rotations are interpolated. Rotations before the
+        first and after the last finite knot are constant.
+
+    Returns
+    -------
+    rotation_matrices : np.array
+        Interpolated rotation matrices, array of shape (len(times), 3, 3)
+        (NaN without finite knots).
+    """
+    from scipy.spatial.transform import Rotation
+    
+    finite = np.all(np.isfinite(knot_matrices), axis=(1, 2))
+    knots, knot_matrices = np.asarray(knots)[finite], np.asarray(knot_matrices)[finite]
+    if len(knots) < 2:
+        return np.repeat(knot_matrices, len(times), axis=0) if len(knots) == 1 else np.full((len(times), 3, 3), np.nan)
+    times = np.clip(times, knots[0], knots[-1])
+    
+    # unit quaternions (x, y, z, w) of the knot rotations, along the shortest path
+    quats = Rotation.from_matrix(knot_matrices).as_quat()
+    flip = np.einsum('ni,ni->n', quats[1:], quats[:-1]) < 0
+    quats[1:][np.cumsum(flip) % 2 == 1] *= -1
+    
+    segment = np.clip(np.searchsorted(knots, times, side='right') - 1, 0, len(knots) - 2)
+    fraction = (times - knots[segment]) / (knots[segment + 1] - knots[segment])
+    q0, q1 = quats[segment], quats[segment + 1]
+    theta = np.arccos(np.clip(np.einsum('ni,ni->n', q0, q1), -1, 1))
+    sin_theta = np.sin(theta)
+    small = sin_theta < 1e-9
+    w0 = np.where(small, 1 - fraction, np.sin((1 - fraction) * theta) / np.where(small, 1, sin_theta))
+    w1 = np.where(small, fraction, np.sin(fraction * theta) / np.where(small, 1, sin_theta))
+    q = w0[:, None] * q0 + w1[:, None] * q1
+    x, y, z, w = (q / np.linalg.norm(q, axis=1)[:, None]).T
+    
+    rotation_matrices = np.empty((len(q), 3, 3))
+    rotation_matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    rotation_matrices[:, 0, 1] = 2 * (x * y - z * w)
+    rotation_matrices[:, 0, 2] = 2 * (x * z + y * w)
+    rotation_matrices[:, 1, 0] = 2 * (x * y + z * w)
+    rotation_matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    rotation_matrices[:, 1, 2] = 2 * (y * z - x * w)
+    rotation_matrices[:, 2, 0] = 2 * (x * z - y * w)
+    rotation_matrices[:, 2, 1] = 2 * (y * z + x * w)
+    rotation_matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return rotation_matrices
+
+
+def rotate_acceleration_axis(acc, orientation_step = None, median_block = None, chunk = 65536):
     """ Rotate acceleration signal to constant direction.
 
     Parameters
     ----------
     acc : pd.DataFrame ['x','y','z']
         Acceleration dataframe.
+    orientation_step : int
+        Number of samples between orientation estimates (default - None,
+        orientation of every sample). Rotations between the estimates are
+        spherically interpolated (slerp), estimates without direction
+        (e.g. missing values) are interpolated over with a warning.
+    median_block : int
+        Block length of approximate rolling median of acceleration directions
+        (default - None, exact rolling median), see sliding_median.
+    chunk : int
+        Number of samples rotated at once with orientation_step.
 
     Returns
     -------
     acc_rotated : pd.DataFrame
-        Retotated acceleration dataframe.
+        Retotated acceleration dataframe. With orientation_step, 
+        acc_rotated.attrs['orientation_deviation'] holds the maximal and mean
+        angle (degrees) between interpolated and exact rotations in the middle
+        of the steps and the number of interpolated estimates.
     """
     
-    # Get rolling median filter of original acceleration axis directions
-    med_acc_segment = acc.rolling(50*6, center = True, min_periods = 25).median()
-    
     # the reference direction of acceleartion vector (from belt)
     vector_reference = [-990,   60,  150 ]
     vectors_original = acc.values
-    vectors_compare = med_acc_segment.values
-    
-    # Create rotation matrices
-    rotation_matrices = [rotation_matrix_from_vectors(vector_reference, v_n) for v_n in vectors_compare]
     
-    # Rotate original acceleration signal
-    r = R.from_matrix(rotation_matrices)
-    vector_rotated = r.apply(vectors_original, inverse=True)
+    if orientation_step is None or orientation_step <= 1 or len(acc) <= orientation_step:
+        # Get rolling median filter of original acceleration axis directions
+        vectors_compare = sliding_median(vectors_original, 50*6, 25, median_block)
+        
+        # Create rotation matrices
+        rotation_matrices = rotation_matrices_from_vectors(vector_reference, vectors_compare)
+        
+        # Rotate original acceleration signal (inverse rotation, R^T v)
+        vector_rotated = np.einsum('nji,nj->ni', rotation_matrices, vectors_original)
+        
+        # rotations of short signals are exact
+        orientation_deviation = None
+        if orientation_step is not None and orientation_step > 1:
+            orientation_deviation = {'max': 0.0, 'mean': 0.0, 'interpolated': 0}
+    else:
+        # Rolling median directions only at the orientation estimates (knots)
+        knots = np.append(np.arange(0, len(acc) - 1, orientation_step), len(acc) - 1)
+        vectors_compare = window_medians(vectors_original, knots, 50*6, 25)
+        knot_matrices = rotation_matrices_from_vectors(vector_reference, vectors_compare)
+        
+        interpolated = int(np.sum(~np.all(np.isfinite(knot_matrices), axis=(1, 2))))
+        if interpolated > 0:
+            warnings.warn(f"{interpolated} of {len(knots)} acceleration orientation estimates are not finite, rotations are interpolated over them")
+        
+        # Interpolate rotations to every sample and rotate original
+        # acceleration signal (inverse rotation, R^T v) in chunks
+        vector_rotated = np.empty(vectors_original.shape)
+        for start in range(0, len(acc), chunk):
+            times = np.arange(start, min(start + chunk, len(acc)))
+            rotation_matrices = slerp_rotation_matrices(knots, knot_matrices, times)
+            vector_rotated[times] = np.einsum('nji,nj->ni', rotation_matrices, vectors_original[times])
+        
+        # Deviation from exact rotations in the middle of the steps
+        middle = (knots[:-1] + knots[1:]) // 2
+        exact_matrices = rotation_matrices_from_vectors(vector_reference, window_medians(vectors_original, middle, 50*6, 25))
+        middle_matrices = slerp_rotation_matrices(knots, knot_matrices, middle)
+        angles = np.degrees(np.arccos(np.clip((np.einsum('nji,nji->n', exact_matrices, middle_matrices) - 1) / 2, -1, 1)))
+        angles = angles[np.isfinite(angles)]
+        orientation_deviation = {'max': np.max(angles) if len(angles) > 0 else np.nan,
+                                 'mean': np.mean(angles) if len(angles) > 0 else np.nan,
+                                 'interpolated': interpolated}
     
     # Create dataframe of rotated acceleration values
     acc_rotated = pd.DataFrame(vector_rotated, columns = ['x','y','z'])
+    if orientation_deviation is not None:
+        acc_rotated.attrs['orientation_deviation'] = orientation_deviation
     
     return acc_rotated
 
 def butter_lowpass_filter(data, cutoff, fs, order):
-    nyq = fs/2
-    normal_cutoff = cutoff / nyq
-    
-    # Get the filter coefficients 
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    y = filtfilt(b, a, data)
+    # Zero-phase filtering with the cached filter (second-order sections)
+    y = butter_filtfilt(data, order, cutoff, fs, 'low')
     return y
\ No newline at end of file
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from PA_algorithms import detect_steps, steps_per_epoch, activity_intensity
+from utils import ranges
+
+
+class ActivityTimeline(object):
+    """ Steps and physical activity of one recording.
+
+    Steps are detected in acceleration magnitudes of RecordingContext,
+    a configuration is given by magnitude name (see RecordingContext.acc_mod),
+    step detection threshold max_val and optional low-pass filter
+    filt = (cutoff, fs, order) of the magnitude. Every result is computed on
+    the first request and shared by all analysis stages (memoized arrays
+    are read-only).
+    """
+    def __init__(self, context):
+        self.context = context
+        self.fs = context.metadata['acc_fs']
+        self.results = {}
+
+    def get(self, key, compute):
+        """ Get memoized result, compute it on the first request.
+
+        Parameters
+        ----------
+        key : hashable
+            Result key.
+        compute : callable
+            Function computing the result, compute().
+
+        Returns
+        -------
+        value : object
+            Memoized result.
+        """
+        if key not in self.results:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            self.results[key] = value
+        return self.results[key]
+
+    def acc_mod(self, name, filt = None):
+        """ Acceleration magnitude used for step detection.
+
+        Parameters
+        ----------
+        name : str
+            Magnitude name (see RecordingContext.acc_mod).
+        filt : tuple
+            Low-pass filter (cutoff, fs, order) of magnitude (default - None, not filtered).
+
+        Returns
+        -------
+        acc_mod : np.array
+            Acceleration magnitude.
+        """
+        if filt is None:
+            return self.context.acc_mod(name)
+        return self.context.acc_mod_filt(name, *filt)
+
+    def steps(self, name, max_val = 150, filt = None):
+        """ Detected steps.
+
+        Parameters
+        ----------
+        name : str
+            Magnitude name (see RecordingContext.acc_mod).
+        max_val : int
+            Maximal value threshold for step detection.
+        filt : tuple
+            Low-pass filter (cutoff, fs, order) of magnitude (default - None, not filtered).
+
+        Returns
+        -------
+        steps_arr : np.array
+            Indexes of detected steps (see detect_steps).
+        """
+        return self.get(('steps', name, filt, max_val),
+                        lambda: detect_steps(self.acc_mod(name, filt), self.fs, max_val))
+
+    def epoch_steps(self, name, max_val = 150, filt = None, sec = 60):
+        """ Number of steps in consecutive epochs.
+
+        Parameters
+        ----------
+        name, max_val, filt : str, int, tuple
+            Step detection configuration (see steps).
+        sec : int
+            Epoch duration in seconds.
+
+        Returns
+        -------
+        time_array : np.array
+            Start time of every epoch in seconds.
+        num : np.array
+            Number of steps in every epoch.
+        """
+        return self.get(('epoch_steps', name, filt, max_val, sec),
+                        lambda: steps_per_epoch(self.steps(name, max_val, filt), len(self.acc_mod(name, filt)), self.fs, sec))
+
+    def steps_min(self, name, max_val = 150, filt = None, sec = 60):
+        """ Steps per minute in consecutive epochs.
+
+        Parameters
+        ----------
+        name, max_val, filt, sec : str, int, tuple, int
+            Step detection configuration and epoch duration (see epoch_steps).
+
+        Returns
+        -------
+        steps_min : np.array
+            Steps per minute in every epoch.
+        """
+        return self.get(('steps_min', name, filt, max_val, sec),
+                        lambda: np.array(self.epoch_steps(name, max_val, filt, sec)[1])*(60/sec))
+
+    def intensity(self, name, max_val = 150, filt = None, sec = 60):
+        """ Physical activity intensity in consecutive epochs.
+
+        Parameters
+        ----------
+        name, max_val, filt, sec : str, int, tuple, int
+            Step detection configuration and epoch duration (see epoch_steps).
+
+        Returns
+        -------
+        num_arr : np.array
+            Physical activity intensity (0 - no physical acivity, 1 - light, 2 - medium, 3 - heavy).
+        """
+        return self.get(('intensity', name, filt, max_val, sec),
+                        lambda: activity_intensity(self.epoch_steps(name, max_val, filt, sec)[1], 60/sec))
+
+    def step_detection(self, name, max_val = 150, filt = None, sec = 60):
+        """ Steps and physical activity (outputs of step_detection_TAF).
+
+        Parameters
+        ----------
+        name, max_val, filt, sec : str, int, tuple, int
+            Step detection configuration and epoch duration (see epoch_steps).
+
+        Returns
+        -------
+        steps_arr : np.array
+            Indexes of detected steps (see steps).
+        time_array : np.array
+            Start time of every epoch in seconds (see epoch_steps).
+        steps_min : np.array
+            Steps per minute in every epoch (see steps_min).
+        num_arr : np.array
+            Physical activity intensity in every epoch (see intensity).
+        """
+        time_array, _ = self.epoch_steps(name, max_val, filt, sec)
+        return (self.steps(name, max_val, filt), time_array,
+                self.steps_min(name, max_val, filt, sec), self.intensity(name, max_val, filt, sec))
+
+    def stepping_ranges(self, name, max_val = 150, filt = None, max_stop = 5):
+        """ Bouts of consistent stepping.
+
+        Parameters
+        ----------
+        name, max_val, filt : str, int, tuple
+            Step detection configuration (see steps).
+        max_stop : float
+            Maximal pause between steps of a bout in seconds.
+
+        Returns
+        -------
+        stepping_ranges : np.array
+            First and last step interval (indexes of np.diff(steps_arr)) of every bout.
+        """
+        def compute():
+            diffs = np.diff(self.steps(name, max_val, filt)/self.fs)
+            return np.array(ranges(np.where(diffs < max_stop)[0]))
+        return self.get(('stepping_ranges', name, filt, max_val, max_stop), compute)
+
+    def active_ranges(self, name, max_val = 150, filt = None, min_steps = 60, sec = 60):
+        """ Bouts of consecutive active epochs.
+
+        Parameters
+        ----------
+        name, max_val, filt, sec : str, int, tuple, int
+            Step detection configuration and epoch duration (see epoch_steps).
+        min_steps : int
+            Epochs with more steps per minute are active.
+
+        Returns
+        -------
+        active_ranges : list
+            First and last epoch of every bout.
+        """
+        return self.get(('active_ranges', name, filt, max_val, min_steps, sec),
+                        lambda: ranges(np.where(self.steps_min(name, max_val, filt, sec) > min_steps)[0]))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from functools import lru_cache
+
+import numpy as np
+from scipy import signal
+
+
+@lru_cache(maxsize=64)
+def butter_sos(order, cutoff, fs, btype = 'low'):
+    """ Design Butterworth filter in second-order sections (cached).
+
+    Parameters
+    ----------
+    order : int
+        Filter order.
+    cutoff : float or tuple
+        Cut-off frequency (Hz), pair of frequencies for band filters.
+    fs : float
+        Sampling rate.
+    btype : str
+        Filter type ('low', 'high', 'bandpass', 'bandstop').
+
+    Returns
+    -------
+    sos : np.array
+        Read-only second-order sections of the filter.
+    """
+    sos = signal.butter(order, cutoff, btype=btype, fs=fs, output='sos')
+    sos.setflags(write=False)
+    return sos
+
+
+def butter_filtfilt(data, order, cutoff, fs, btype = 'low', axis = 0):
+    """ Zero-phase Butterworth filtering.
+
+    Parameters
+    ----------
+    data : np.array
+        Signal, or signals of array of shape (N, k) filtered along axis.
+    order : int
+        Filter order.
+    cutoff : float or tuple
+        Cut-off frequency (Hz), pair of frequencies for band filters.
+    fs : float
+        Sampling rate.
+    btype : str
+        Filter type ('low', 'high', 'bandpass', 'bandstop').
+    axis : int
+        Axis along which signals are filtered.
+
+    Returns
+    -------
+    data_filt : np.array
+        Filtered signal(s).
+    """
+    if isinstance(cutoff, list):
+        cutoff = tuple(cutoff)
+    # scipy filters need writable coefficients, the cached design is read-only
+    sos = np.array(butter_sos(order, cutoff, fs, btype))
+    return signal.sosfiltfilt(sos, np.asarray(data, dtype=float), axis=axis)
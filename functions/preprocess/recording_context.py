@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils import signals_astype
+from acceleration_preprocess import acceleration_magnitude, rotate_acceleration_axis, butter_lowpass_filter
+from PA_algorithms import MadIndex
+from filter_bank import butter_filtfilt
+from activity_timeline import ActivityTimeline
+
+
+class RecordingContext(object):
+    """ Preprocessed acceleration signals of one recording.
+
+    Signals are computed on the first request and shared by all analysis
+    stages of the recording (memoized arrays are read-only).
+
+    Acceleration magnitudes (acc_mod) available by name:
+        'raw' - magnitude of original axes,
+        'rotated' - magnitude of rotated axes,
+        'rotated_x' - rotated x axis,
+        'rotated_x_abs' - magnitude of rotated x axis,
+        'highpass' - magnitude of high-pass (0.3 Hz) filtered original axes.
+    All magnitudes have their mean removed.
+
+    With dtype (e.g. np.float32) acceleration and memoized signals are
+    stored in dtype, computations are done in float64. With tolerance
+    every memoized signal is compared with its float64 computation from
+    the original acceleration, relative errors are kept in
+    tolerance_report (warning if tolerance is exceeded).
+    """
+    def __init__(self, acc, metadata, dtype = None, tolerance = None):
+        self.metadata = metadata
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.acc = acc if self.dtype is None else signals_astype(acc, self.dtype)
+        self.signals = {}
+        
+        # float64 twin for tolerance checks
+        self.tolerance = tolerance
+        self.tolerance_report = {}
+        self.reference = None
+        if tolerance is not None and self.dtype is not None and self.dtype != np.float64:
+            self.reference = RecordingContext(acc, metadata, np.float64)
+
+    def get(self, key, compute):
+        """ Get memoized signal, compute it on the first request.
+
+        Parameters
+        ----------
+        key : hashable
+            Signal key.
+        compute : callable
+            Function computing the signal from the context, compute(context).
+
+        Returns
+        -------
+        value : object
+            Memoized signal.
+        """
+        if key not in self.signals:
+            value = compute(self)
+            is_signal = isinstance(value, (np.ndarray, pd.DataFrame))
+            if self.dtype is not None and isinstance(value, np.ndarray):
+                value = value.astype(self.dtype, copy=False)
+            if self.dtype is not None and isinstance(value, pd.DataFrame):
+                value = signals_astype(value, self.dtype)
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            self.signals[key] = value
+            
+            if self.reference is not None and is_signal:
+                self.check_tolerance(key, value, self.reference.get(key, compute))
+        return self.signals[key]
+
+    def check_tolerance(self, key, value, reference):
+        """ Compare signal with its float64 reference.
+
+        Parameters
+        ----------
+        key : hashable
+            Signal key.
+        value : np.array or pd.DataFrame
+            Signal.
+        reference : np.array or pd.DataFrame
+            Reference signal (float64).
+
+        Returns
+        -------
+        error : float
+            Maximal absolute error relative to maximal absolute reference value.
+        """
+        value = np.asarray(value, dtype=float)
+        reference = np.asarray(reference, dtype=float)
+        scale = np.nanmax(np.abs(reference)) if reference.size > 0 else 0.0
+        error = np.nanmax(np.abs(value - reference)) / scale if scale > 0 else 0.0
+        self.tolerance_report[key] = error
+        if error > self.tolerance:
+            warnings.warn(f"Signal {key} in {self.dtype} differs from float64 by {error:.2e} (tolerance {self.tolerance:.2e})")
+        return error
+
+    def rotated_acc(self):
+        """ Acceleration rotated to constant direction.
+
+        Returns
+        -------
+        acc_rotated : pd.DataFrame
+            Rotated acceleration dataframe (see rotate_acceleration_axis).
+        """
+        return self.get('rotated_acc', lambda context: rotate_acceleration_axis(context.acc[['x','y','z']],
+                                                                               context.metadata.get('acc_orientation_step'),
+                                                                               context.metadata.get('acc_median_block')))
+
+    def acc_mod(self, name):
+        """ Acceleration magnitude with mean removed.
+
+        Parameters
+        ----------
+        name : str
+            Magnitude name ('raw', 'rotated', 'rotated_x', 'rotated_x_abs', 'highpass').
+
+        Returns
+        -------
+        acc_mod : np.array
+            Acceleration magnitude.
+        """
+        return self.get(('acc_mod', name), lambda context: context._compute_acc_mod(name))
+
+    def acc_mod_filt(self, name, cutoff, fs, order):
+        """ Low-pass filtered acceleration magnitude.
+
+        Parameters
+        ----------
+        name : str
+            Magnitude name (see acc_mod).
+        cutoff : float
+            Cut-off frequency of Butterworth filter.
+        fs : int
+            Sampling rate used for filter design.
+        order : int
+            Order of Butterworth filter.
+
+        Returns
+        -------
+        acc_mod_filt : np.array
+            Filtered acceleration magnitude.
+        """
+        return self.get(('acc_mod_filt', name, cutoff, fs, order),
+                        lambda context: butter_lowpass_filter(context.acc_mod(name), cutoff, fs, order))
+
+    def mad_index(self, name, cutoff = None, fs = None, order = None):
+        """ Per-second mean amplitude deviation index of acceleration magnitude.
+
+        Parameters
+        ----------
+        name : str
+            Magnitude name (see acc_mod).
+        cutoff, fs, order : float, int, int
+            Low-pass filter of magnitude (see acc_mod_filt, default - None, not filtered).
+
+        Returns
+        -------
+        mad_index : MadIndex
+            MAD of every second with cumulative sums.
+        """
+        if cutoff is None:
+            return self.get(('mad_index', name), lambda context: MadIndex(context.acc_mod(name), context.metadata['acc_fs']))
+        return self.get(('mad_index', name, cutoff, fs, order),
+                        lambda context: MadIndex(context.acc_mod_filt(name, cutoff, fs, order), context.metadata['acc_fs']))
+
+    def activity_timeline(self):
+        """ Steps and physical activity of the recording.
+
+        Returns
+        -------
+        activity_timeline : ActivityTimeline
+            Step detection results of every threshold configuration.
+        """
+        return self.get('activity_timeline', lambda context: ActivityTimeline(context))
+
+    def _compute_acc_mod(self, name):
+        # magnitudes are computed in float64 whatever the storage dtype
+        if name == 'raw':
+            acc_mod_or = np.sqrt(np.sum(np.square(self.acc[['x','y','z']].astype(float, copy=False)), axis=1))
+        elif name == 'rotated':
+            rotated_acc = self.rotated_acc().astype(float, copy=False)
+            acc_mod_or = acceleration_magnitude([rotated_acc['x'], rotated_acc['y'], rotated_acc['z']])
+        elif name == 'rotated_x':
+            acc_mod_or = self.rotated_acc()['x'].astype(float, copy=False)
+        elif name == 'rotated_x_abs':
+            acc_mod_or = np.sqrt(np.sum(np.square(self.rotated_acc()[['x']].astype(float, copy=False)), axis=1))
+        elif name == 'highpass':
+            # Butterworth high-pass filter of all axes
+            Acc_filt = butter_filtfilt(np.array(self.acc[['z','y','x']]), 4, 0.3, self.metadata['acc_fs'], 'high')
+            acc_mod_or = acceleration_magnitude(Acc_filt.T)
+        else:
+            raise ValueError(f"Unknown acceleration magnitude '{name}'")
+        return np.array(acc_mod_or - np.mean(acc_mod_or))
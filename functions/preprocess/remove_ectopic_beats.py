@@ -6,6 +6,10 @@ from os import path
 import numpy as np
 
 def detect_ectopics(hr_c):
+    # directories
+    work_dir = '../'
+    sys.path.insert(1,work_dir + '/app/functions/detectors')
+    from MedianFilter import MedianFilter
     
     dRRs = hr_c[1:] - hr_c[0:-1]
     dRRs = np.append(np.array([0]), dRRs) 
@@ -30,35 +34,9 @@ def detect_ectopics(hr_c):
     with np.errstate(divide='ignore'):
         dRR = dRRs / Th1
     
-    mRRs = np.empty(len(hr_c))
-    for i_mrr in range(len(hr_c)):
-        if i_mrr < 5:
-            lim_min = 0
-        else:
-            lim_min = i_mrr-5
-        if i_mrr > len(hr_c)-5:
-            lim_max = len(hr_c)
-        else:
-            lim_max = i_mrr+5
-        rr_array = np.abs(hr_c[lim_min:lim_max])
-        mRRsi = hr_c[i_mrr] - np.median(rr_array)
-        if mRRsi < 0:
-            mRRs[i_mrr] = mRRsi*2
-        else:
-            mRRs[i_mrr] = mRRsi
-    
-    medRR = np.empty(len(hr_c))
-    for i_mrr in range(len(hr_c)):
-        if i_mrr < 5:
-            lim_min = 0
-        else:
-            lim_min = i_mrr-5
-        if i_mrr > len(hr_c)-5:
-            lim_max = len(hr_c)
-        else:
-            lim_max = i_mrr+5
-        rr_array = np.abs(hr_c[lim_min:lim_max])
-        medRR[i_mrr] = hr_c[i_mrr] - np.median(rr_array)
+    # deviation from the median of |RR| in the window [i-5, i+5)
+    medRR = np.asarray(hr_c, dtype=float) - MedianFilter.window_median(np.abs(hr_c), 5, 5)
+    mRRs = np.where(medRR < 0, medRR*2, medRR)
     
     
     
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from scipy import signal
+
+
+def rational_ratio(fs_in, fs_out, max_denominator = 1000):
+    """ Get resampling ratio as a fraction of small integers.
+
+    Parameters
+    ----------
+    fs_in : float
+        Input sampling rate.
+    fs_out : float
+        Output sampling rate.
+    max_denominator : int
+        Largest allowed downsampling factor.
+
+    Returns
+    -------
+    up : int
+        Upsampling factor.
+    down : int
+        Downsampling factor.
+    """
+    ratio = (Fraction(fs_out) / Fraction(fs_in)).limit_denominator(max_denominator)
+    return ratio.numerator, ratio.denominator
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(up, down):
+    """ Design anti-aliasing FIR filter for polyphase resampling (cached).
+
+    Same design as scipy.signal.resample_poly with the default Kaiser window.
+
+    Parameters
+    ----------
+    up : int
+        Upsampling factor.
+    down : int
+        Downsampling factor.
+
+    Returns
+    -------
+    h : np.array
+        Read-only filter coefficients.
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+    h.setflags(write=False)
+    return h
+
+
+def resample_signal(x, fs_in, fs_out, num = None, method = 'polyphase'):
+    """ Resample signal from fs_in to fs_out.
+
+    Parameters
+    ----------
+    x : np.array
+        Signal to resample.
+    fs_in : float
+        Input sampling rate.
+    fs_out : float
+        Output sampling rate.
+    num : int
+        Number of output samples (default - len(x) * fs_out / fs_in rounded up).
+    method : str
+        'polyphase' - polyphase filtering with the rational rate ratio,
+        'fft' - scipy.signal.resample (FFT of the whole signal).
+
+    Returns
+    -------
+    x_resampled : np.array
+        Resampled signal.
+    """
+    x = np.asarray(x, dtype=float)
+    up, down = rational_ratio(fs_in, fs_out)
+    if num is None:
+        num = -(-len(x) * up // down)
+
+    if method == 'fft':
+        return signal.resample(x, num, domain='time')
+    if method != 'polyphase':
+        raise ValueError(f"Unknown resampling method '{method}', expected 'polyphase' or 'fft'")
+    if len(x) == 0:
+        return np.zeros(num)
+
+    # signal trend is removed before filtering to avoid transients at the edges
+    x_resampled = signal.resample_poly(x, up, down, window=polyphase_filter(up, down), padtype='line')
+
+    # match requested number of samples
+    if len(x_resampled) >= num:
+        return x_resampled[:num]
+    return np.pad(x_resampled, (0, num - len(x_resampled)), mode='edge')
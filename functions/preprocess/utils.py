@@ -22,3 +22,25 @@ def enablePrint():
     
 def monoExp(x, m, t, b):
     return -m * np.exp(-t * x) + b
+
+def signals_astype(df, dtype, keep = ('timestamp',)):
+    """ Cast signal columns of dataframe to dtype.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Signals dataframe.
+    dtype : np.dtype
+        Data type of signal columns.
+    keep : tuple
+        Columns kept in their data type (timestamps need float64 precision).
+
+    Returns
+    -------
+    df_cast : pd.DataFrame
+        Dataframe with signal columns of dtype (df itself if nothing changes).
+    """
+    columns = [x for x in df.keys() if x not in keep and pd.api.types.is_numeric_dtype(df[x]) and df[x].dtype != dtype]
+    if len(columns) == 0:
+        return df
+    return df.astype({x: dtype for x in columns})
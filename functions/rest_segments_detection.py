@@ -1,11 +1,10 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import pandas as pd
-from scipy import signal
 import sys
 
 
-def get_best_quality_ppg(ppg_extracted, metadata):
+def get_best_quality_ppg(ppg_extracted, metadata, return_results = False):
     """ Get ppg with the best signal quality index (SQI).
 
     Parameters
@@ -14,6 +13,8 @@ def get_best_quality_ppg(ppg_extracted, metadata):
         photoplethysmogram dataframe segment.
     metadata : dict
         metadata of signal.
+    return_results : bool
+        Also return the AF_PPG_detector outputs of every PPG signal.
 
     Returns
     -------
@@ -21,29 +22,90 @@ def get_best_quality_ppg(ppg_extracted, metadata):
         PPG signal that have best quality according to SQI index.
     sqis : list
         List containing good quality PPG. 
+    results : list
+        AFPPGResult with peak indexes and SQI of every PPG signal (only if return_results).
     """
     # directories
     work_dir = '../'
     sys.path.insert(1,work_dir + '/app/functions/detectors')
-    from AF_PPG_detector import AF_PPG_detector
+    from AF_PPG_detector import AF_PPG_detector_multichannel
     
     if metadata['ppg_n'] > 1:
         ppg_signals = [ppg_extracted['ppg0'], ppg_extracted['ppg1'], ppg_extracted['ppg2']]
-        sqis = []
-        for n_sig in ppg_signals:
-            outPPG, peakValArr, peakIndArr, sqi, det_pattern, out_pattern, corr_pattern = AF_PPG_detector(np.array(n_sig), metadata['ppg_resample_fs'])
-            sqis.append(np.round(np.sum(sqi)/len(sqi),3))
-        sig_to_analyse = np.argmax(sqis)
+        sig_to_analyse_first = False
     else:
-        sqis = []
-        outPPG, peakValArr, peakIndArr, sqi, det_pattern, out_pattern, corr_pattern = AF_PPG_detector(ppg_extracted['ppg0'], metadata['ppg_resample_fs'])
-        sqis.append(np.round(np.sum(sqi)/len(sqi),3))
+        ppg_signals = [ppg_extracted['ppg0']]
+        sig_to_analyse_first = True
+    
+    # all PPG signals are processed by the detector in a single pass,
+    # only peaks and run-length encoded SQI are kept
+    results = AF_PPG_detector_multichannel(np.array(ppg_signals), metadata['ppg_resample_fs'],
+                                           outputs = ('peakIndArr', 'sqi'), run_length = True)
+    sqis = []
+    for result in results:
+        sqis.append(np.round(result.mean('sqi'),3))
+    
+    if sig_to_analyse_first:
         sig_to_analyse = 0
+    else:
+        sig_to_analyse = np.argmax(sqis)
     
+    if return_results:
+        return sig_to_analyse, sqis, results
     return sig_to_analyse, sqis
 
 
-def rest_segments_detection_rr(acc, rr, metadata):
+def search_rest_windows(steps_min, time_array, metadata, mad_index, top_k = None):
+    """ Find baseline rest windows and rank them by activity.
+
+    Parameters
+    ----------
+    steps_min : np.array
+        Steps per minute.
+    time_array : np.array
+        Start time of every minute in seconds.
+    metadata : dict
+        metadata of signal.
+    mad_index : MadIndex
+        Mean amplitude deviation index of acceleration.
+    top_k : int
+        Number of returned windows (default - None, all windows).
+
+    Returns
+    -------
+    rest_windows : np.array
+        Start and end times (seconds) of rest windows, array of shape (k, 2),
+        ranked by mean amplitude deviation (the least active first).
+    mads : np.array
+        Mean amplitude deviation of ranked rest windows.
+    """
+    ## update constants
+    baseline_rest_duration = metadata['baseline_rest_duration'] + 1 # minutes
+    max_steps_during_rest = metadata['max_steps_during_rest'] # steps
+    
+    n_windows = len(time_array)-(baseline_rest_duration+1)
+    if len(steps_min) <= 5 or n_windows <= 0:
+        return np.zeros((0, 2)), np.array([])
+    
+    rest_minutes = np.array(steps_min, dtype=float)
+    rest_minutes[rest_minutes<max_steps_during_rest] = 1
+    rest_minutes[rest_minutes>max_steps_during_rest] = 0
+    
+    # sum of rest minutes in every window of baseline_rest_duration minutes
+    rest_minutes_sum = np.concatenate(([0], np.cumsum(rest_minutes)))
+    T_sums = rest_minutes_sum[baseline_rest_duration:baseline_rest_duration+n_windows] - rest_minutes_sum[:n_windows]
+    inds_rest = np.where(T_sums==baseline_rest_duration)[0]
+    
+    # analysed interval of window i
+    T_durations = np.column_stack((time_array[inds_rest+2], time_array[inds_rest+baseline_rest_duration+1]))
+    mads = mad_index.mean(T_durations[:, 0], T_durations[:, 1])
+    
+    # windows without MAD first (as np.argmin)
+    order = np.argsort(np.where(np.isnan(mads), -np.inf, mads), kind='stable')[:top_k]
+    return T_durations[order], mads[order]
+
+
+def rest_segments_detection_rr(acc, rr, metadata, context = None):
     """ Analyse signal - find segments in rr and acc signals.
 
     Parameters
@@ -54,6 +116,8 @@ def rest_segments_detection_rr(acc, rr, metadata):
         rr dataframe.
     metadata : dict
         metadata of signal.
+    context : RecordingContext
+        Preprocessed signals of the recording (default - created from acc).
 
     Returns
     -------
@@ -65,18 +129,11 @@ def rest_segments_detection_rr(acc, rr, metadata):
     sys.path.insert(1,work_dir + '/functions/preprocess')
     sys.path.insert(1,work_dir + '/functions/measures')
     sys.path.insert(1,work_dir + '/functions/detectors')
-    from PA_algorithms import step_detection_TAF, calc_mad
-    from AF_PPG_detector import AF_PPG_detector
-    from acceleration_preprocess import acceleration_preprocess, acceleration_magnitude, rotate_acceleration_axis, butter_lowpass_filter
+    from recording_context import RecordingContext
     from heart_rate_variability import evaluate_heart_rate_variability, estimate_heart_rate_variability
     
-    ## update constants
-    baseline_rest_duration = metadata['baseline_rest_duration'] + 1 # minutes
-    max_steps_during_rest = metadata['max_steps_during_rest'] # steps
-    
-    # Rotate 
-    acc_original_axis = acc[['x','y','z']]
-    rotated_acc = rotate_acceleration_axis(acc_original_axis)
+    if context is None:
+        context = RecordingContext(acc, metadata)
     
     position_configuration = 0
     if metadata['position'] == 'wrist':
@@ -87,55 +144,20 @@ def rest_segments_detection_rr(acc, rr, metadata):
         position_configuration = 0
         
     if position_configuration == 0 or position_configuration == 1:
-        acc_mod_or = np.sqrt(np.sum(np.square(rotated_acc[['x']]), axis=1))
-        acc_mod = np.array(acc_mod_or - np.mean(acc_mod_or))
-        acc_mod_filt = butter_lowpass_filter(acc_mod, 3, 50, 5)
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod_filt, metadata['acc_fs'], max_val = 200, min_val = 150)     # fs_oh1, max_val = 100, min_val = 0
+        mad_index = context.mad_index('rotated_x_abs', 3, 50, 5)
+        steps_arr, time_array, steps_min, num_arr = context.activity_timeline().step_detection('rotated_x_abs', max_val = 200, filt = (3, 50, 5))     # fs_oh1, max_val = 100, min_val = 0
     
     if position_configuration == 2:
-        # acceleration preprocess
-        Acc_m = np.array(acc['y'])
-        Acc_a = np.array(acc['x'])
-        Acc_v = np.array(acc['z'])
-            
-        # Butterworth high-pass filter
-        b, a = signal.butter(N=4, Wn=0.3, btype="highpass", fs = metadata['acc_fs'])
-        Acc_m_filt = signal.filtfilt(b, a, Acc_m)
-        Acc_a_filt = signal.filtfilt(b, a, Acc_a)
-        Acc_v_filt = signal.filtfilt(b, a, Acc_v)
-        
-        acc_mod_or = acceleration_magnitude([Acc_v_filt, Acc_m_filt, Acc_a_filt])
-        acc_mod = (np.array(acc_mod_or - np.mean(acc_mod_or)))
-        acc_mod_filt = butter_lowpass_filter(acc_mod, 3, 50, 5)
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod_filt, metadata['acc_fs'], max_val = 200, min_val = 150)   # , max_val = 150, min_val = 0
+        # magnitude of high-pass filtered acceleration
+        mad_index = context.mad_index('highpass', 3, 50, 5)
+        steps_arr, time_array, steps_min, num_arr = context.activity_timeline().step_detection('highpass', max_val = 200, filt = (3, 50, 5))   # , max_val = 150, min_val = 0
     
-    if len(steps_min) > 5:
-        # Estimate physical activity measures
-        rest_minutes = steps_min.copy()
-        rest_minutes[rest_minutes<max_steps_during_rest] = 1
-        rest_minutes[rest_minutes>max_steps_during_rest] = 0
+    ## Find rest windows, the least active first
+    rest_windows, _ = search_rest_windows(steps_min, time_array, metadata, mad_index, top_k = 1)
         
-        rest_minutes_arr = np.array(rest_minutes)
-        
-        T_durations = np.array([[time_array[i+2], time_array[i+baseline_rest_duration+1]] for i in range(len(time_array)-(baseline_rest_duration+1))])
-        T_minutes = np.array([np.array(rest_minutes_arr[i:i+baseline_rest_duration]) for i in range(len(rest_minutes_arr)-(baseline_rest_duration+1))])
-        if len(T_minutes) > 0:
-            inds_rest = np.where(np.sum(T_minutes, axis = 1)==baseline_rest_duration)[0]
-        else:
-            inds_rest = np.array([])
-    else:
-        inds_rest = np.array([])
-        
-    if len(inds_rest) > 0: # If there are any resting intervals 
+    if len(rest_windows) > 0: # If there are any resting intervals 
         ## determine optimal baseline rest interval based on MAD
-        mads_inds = []
-        for inds_test in inds_rest:
-            inds_to_test = T_durations[inds_test]
-            acc_to_test = acc_mod_filt[int(inds_to_test[0]*metadata['acc_fs']):int(inds_to_test[1]*metadata['acc_fs'])]
-            mads_inds.append(calc_mad(acc_to_test, metadata['acc_fs'])[1])
-        ind_min_activity_rest_phase = np.argmin(mads_inds)
-        
-        rest_duration_to_analyse = T_durations[inds_rest[ind_min_activity_rest_phase]]
+        rest_duration_to_analyse = rest_windows[0]
         
         ## Evaluate HRV indicators
         
@@ -160,7 +182,7 @@ def rest_segments_detection_rr(acc, rr, metadata):
 
 
 
-def rest_segments_detection(acc, ppg, metadata):
+def rest_segments_detection(acc, ppg, metadata, context = None):
     """ Analyse signal - find segments.
 
     Parameters
@@ -171,6 +193,8 @@ def rest_segments_detection(acc, ppg, metadata):
         photoplethysmogram dataframe.
     metadata : dict
         metadata of signal.
+    context : RecordingContext
+        Preprocessed signals of the recording (default - created from acc).
 
     Returns
     -------
@@ -182,18 +206,12 @@ def rest_segments_detection(acc, ppg, metadata):
     sys.path.insert(1,work_dir + '/functions/preprocess')
     sys.path.insert(1,work_dir + '/functions/measures')
     sys.path.insert(1,work_dir + '/functions/detectors')
-    from PA_algorithms import step_detection_TAF, calc_mad
-    from AF_PPG_detector import AF_PPG_detector
-    from acceleration_preprocess import acceleration_preprocess, acceleration_magnitude, rotate_acceleration_axis, butter_lowpass_filter
+    from recording_context import RecordingContext
     from heart_rate_variability import evaluate_heart_rate_variability
+    from resample_signal import resample_signal
     
-    ## update constants
-    baseline_rest_duration = metadata['baseline_rest_duration'] + 1 # minutes
-    max_steps_during_rest = metadata['max_steps_during_rest'] # steps
-    
-    # Rotate 
-    acc_original_axis = acc[['x','y','z']]
-    rotated_acc = rotate_acceleration_axis(acc_original_axis)
+    if context is None:
+        context = RecordingContext(acc, metadata)
     
     position_configuration = 0
     if metadata['position'] == 'wrist':
@@ -204,55 +222,20 @@ def rest_segments_detection(acc, ppg, metadata):
         position_configuration = 0
         
     if position_configuration == 0 or position_configuration == 1:
-        acc_mod_or = np.sqrt(np.sum(np.square(rotated_acc[['x']]), axis=1))
-        acc_mod = np.array(acc_mod_or - np.mean(acc_mod_or))
-        acc_mod_filt = butter_lowpass_filter(acc_mod, 3, 50, 5)
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod_filt, metadata['acc_fs'], max_val = 200, min_val = 150)     # fs_oh1, max_val = 100, min_val = 0
+        mad_index = context.mad_index('rotated_x_abs', 3, 50, 5)
+        steps_arr, time_array, steps_min, num_arr = context.activity_timeline().step_detection('rotated_x_abs', max_val = 200, filt = (3, 50, 5))     # fs_oh1, max_val = 100, min_val = 0
     
     if position_configuration == 2:
-        # acceleration preprocess
-        Acc_m = np.array(acc['y'])
-        Acc_a = np.array(acc['x'])
-        Acc_v = np.array(acc['z'])
-            
-        # Butterworth high-pass filter
-        b, a = signal.butter(N=4, Wn=0.3, btype="highpass", fs = metadata['acc_fs'])
-        Acc_m_filt = signal.filtfilt(b, a, Acc_m)
-        Acc_a_filt = signal.filtfilt(b, a, Acc_a)
-        Acc_v_filt = signal.filtfilt(b, a, Acc_v)
-        
-        acc_mod_or = acceleration_magnitude([Acc_v_filt, Acc_m_filt, Acc_a_filt])
-        acc_mod = (np.array(acc_mod_or - np.mean(acc_mod_or)))
-        acc_mod_filt = butter_lowpass_filter(acc_mod, 3, 50, 5)
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod_filt, metadata['acc_fs'], max_val = 200, min_val = 150)   # , max_val = 150, min_val = 0
+        # magnitude of high-pass filtered acceleration
+        mad_index = context.mad_index('highpass', 3, 50, 5)
+        steps_arr, time_array, steps_min, num_arr = context.activity_timeline().step_detection('highpass', max_val = 200, filt = (3, 50, 5))   # , max_val = 150, min_val = 0
     
-    if len(steps_min) > 5:
-        # Estimate physical activity measures
-        rest_minutes = steps_min.copy()
-        rest_minutes[rest_minutes<max_steps_during_rest] = 1
-        rest_minutes[rest_minutes>max_steps_during_rest] = 0
-        
-        rest_minutes_arr = np.array(rest_minutes)
+    ## Find rest windows, the least active first
+    rest_windows, _ = search_rest_windows(steps_min, time_array, metadata, mad_index, top_k = 1)
         
-        T_durations = np.array([[time_array[i+2], time_array[i+baseline_rest_duration+1]] for i in range(len(time_array)-(baseline_rest_duration+1))])
-        T_minutes = np.array([np.array(rest_minutes_arr[i:i+baseline_rest_duration]) for i in range(len(rest_minutes_arr)-(baseline_rest_duration+1))])
-        if len(T_minutes) > 0:
-            inds_rest = np.where(np.sum(T_minutes, axis = 1)==baseline_rest_duration)[0]
-        else:
-            inds_rest = np.array([])
-    else:
-        inds_rest = np.array([])
-        
-    if len(inds_rest) > 0: # If there are any resting intervals 
+    if len(rest_windows) > 0: # If there are any resting intervals 
         ## determine optimal baseline rest interval based on MAD
-        mads_inds = []
-        for inds_test in inds_rest:
-            inds_to_test = T_durations[inds_test]
-            acc_to_test = acc_mod_filt[int(inds_to_test[0]*metadata['acc_fs']):int(inds_to_test[1]*metadata['acc_fs'])]
-            mads_inds.append(calc_mad(acc_to_test, metadata['acc_fs'])[1])
-        ind_min_activity_rest_phase = np.argmin(mads_inds)
-        
-        rest_duration_to_analyse = T_durations[inds_rest[ind_min_activity_rest_phase]]
+        rest_duration_to_analyse = rest_windows[0]
         
         ## extract baseline HR rest segment
         ppg_baseline_rest = ppg[int(rest_duration_to_analyse[0]*metadata['ppg_fs']):int(rest_duration_to_analyse[1]*metadata['ppg_fs'])]
@@ -266,22 +249,20 @@ def rest_segments_detection(acc, ppg, metadata):
             ppg_to_resample = ppg_baseline_rest[x_key]
             
             num = int(metadata['ppg_resample_fs']*(t_duration))
-            ppg_resampled = signal.resample(np.array(ppg_to_resample), num, domain='time')
+            ppg_resampled = resample_signal(np.array(ppg_to_resample), metadata['ppg_fs'], metadata['ppg_resample_fs'], num,
+                                            method = metadata.get('ppg_resample_method', 'polyphase'))
             ppg_resample[x_key] = ppg_resampled
         t_ppg_resample = np.linspace(0,t_duration, len(ppg_resample))
         ppg_resample['timestamp'] = t_ppg_resample
         
         
         ## evaluate quality of ppg available signals
-        sig_to_analyse, sqis = get_best_quality_ppg(ppg_resample, metadata)
+        sig_to_analyse, sqis, ppg_results = get_best_quality_ppg(ppg_resample, metadata, return_results = True)
         rest_SQI = sqis[sig_to_analyse]
-        if metadata['ppg_n'] > 1:
-            ppg_signals = [ppg_resample['ppg0'], ppg_resample['ppg1'], ppg_resample['ppg2']]
-        else:
-            ppg_signals = [ppg_resample['ppg0']]
-            sig_to_analyse = 0
         
-        outPPG, peakValArr, peakIndArr, sqi, det_pattern, out_pattern, corr_pattern = AF_PPG_detector(np.array(ppg_signals[sig_to_analyse]), metadata['ppg_resample_fs'])
+        # detector outputs of the best quality signal
+        peakIndArr = ppg_results[sig_to_analyse].peakIndArr
+        sqi = ppg_results[sig_to_analyse].expand('sqi')
         # print(rest_SQI)
         if rest_SQI > metadata['ppg_sqi_lim_rest']:
             HRV_results = evaluate_heart_rate_variability(peakIndArr, sqi, metadata)
@@ -4,7 +4,7 @@ import numpy as np
 import os
 import sys
 
-def segments_detection(acc, metadata):
+def segments_detection(acc, metadata, context = None):
     """Find physical activity segments.
 
     Parameters
@@ -13,6 +13,8 @@ def segments_detection(acc, metadata):
         acceleration dataframe.
     metadata : dict
         metadata of signal.
+    context : RecordingContext
+        Preprocessed signals of the recording (default - created from acc).
 
     Returns
     -------
@@ -22,8 +24,7 @@ def segments_detection(acc, metadata):
     # directories
     work_dir = '../'
     sys.path.insert(1,work_dir + '/app/functions/preprocess')
-    from PA_algorithms import step_detection_TAF, calc_mad
-    from utils import ranges
+    from recording_context import RecordingContext
 
     ##  ---- Update constants
     max_stop = metadata['max_stop'] # seconds
@@ -32,18 +33,16 @@ def segments_detection(acc, metadata):
     rest_time = metadata['rest_time'] #seconds
 
     ## Preprocess
-    acc_mod_or = np.sqrt(np.sum(np.square(acc[['x','y','z']]), axis=1))
-    acc_mod = np.array(acc_mod_or - np.mean(acc_mod_or))
+    if context is None:
+        context = RecordingContext(acc, metadata)
+    acc_mod = context.acc_mod('raw')
+    timeline = context.activity_timeline()
     
     ## Step detection
     if len(acc_mod)>metadata['acc_fs']*100: # at least 100 seconds
-        steps_arr, time_array, steps_min, num_arr = step_detection_TAF(acc_mod, metadata['acc_fs'])
+        steps_arr = np.array(timeline.steps('raw'))
         
-        steps_arr = np.array(steps_arr)
-        diffs = np.diff(steps_arr/metadata['acc_fs'])
-        
-        where_consistent = np.where(diffs < max_stop)[0]
-        stepping_ranges = np.array(ranges(where_consistent))
+        stepping_ranges = timeline.stepping_ranges('raw', max_stop = max_stop)
         ranges_dur = np.array([round(steps_arr[x[1]]/metadata['acc_fs']-steps_arr[x[0]]/metadata['acc_fs']) for x in stepping_ranges])
         
         ranges_valid = stepping_ranges[ranges_dur>min_walking_dur]
@@ -65,9 +64,9 @@ def segments_detection(acc, metadata):
             ends = np.nan
         
         # Calculate median amplitude deviation
-        mads, mn_mad = calc_mad(acc_mod, metadata['acc_fs'])
-        mads_sum = np.array([np.round(np.sum(mads[int(x[0]/metadata['acc_fs']): int(x[1]/metadata['acc_fs'])]),3) for x in inds_valid])
-        mads_mean = np.array([np.round(np.mean(mads[int(x[0]/metadata['acc_fs']): int(x[1]/metadata['acc_fs'])]),3) for x in inds_valid])
+        mad_index = context.mad_index('raw')
+        mads_sum = np.array([np.round(mad_index.sum(x[0]/metadata['acc_fs'], x[1]/metadata['acc_fs']),3) for x in inds_valid])
+        mads_mean = np.array([np.round(mad_index.mean(x[0]/metadata['acc_fs'], x[1]/metadata['acc_fs']),3) for x in inds_valid])
         
         # Create dataframe of walking segments
         dict_walking_bouts = {'ind_start': starts, 'ind_end': ends, 'duration': durations, 'steps':steps_ranges, 'mad_mean':mads_mean, 'mad_sum':mads_sum, 'intensity': average_intensity, 'recovery_steps':recovery_steps, 'rest_steps':rest_steps }
@@ -20,13 +20,14 @@ from evaluate_segments_quality import evaluate_segments_quality_ecg
 from mobility_balance import evaluate_mobility_balance
 from physical_activity import evaluate_physical_activity
 from heart_rate_response import evaluate_heart_rate_response
+from recording_context import RecordingContext
 from heart_rate_variability import estimate_heart_rate_variability, correct_ectopic_beats
 
 class heart_PA_ecg(object):
     """ Class for evaluation of rr and acc signals from Polar H10.
     
     """
-    def __init__(self, acc_, rr_, metadata_):
+    def __init__(self, acc_, rr_, metadata_, dtype = None):
         ## init metedata
         self.metadata = metadata_
         
@@ -36,6 +37,16 @@ class heart_PA_ecg(object):
         self.metadata.update(analysis_specific_durations)
         self.metadata.update(analysis_specific_limits)    
 
+        ## add default metadata parameters if not specified
+        #'acc_orientation_step' - samples between acceleration orientation estimates (None - every sample)
+        #'acc_median_block' - block length of approximate acceleration rolling median (None - exact)
+        self.metadata.setdefault('acc_orientation_step', None)
+        self.metadata.setdefault('acc_median_block', None)
+        #'dtype_tolerance' - relative error of dtype signals checked against float64 (None - no checks)
+        self.metadata.setdefault('dtype_tolerance', None)
+        
+        ## data type of signal arrays (None - as given), timestamps stay float64
+        self.dtype = dtype
 
         ## init signals
         self.acc = acc_
@@ -74,23 +85,28 @@ class heart_PA_ecg(object):
         """
         self.analysis_performed_flag = 0
         if self.signals_present == 1:
+            ## Preprocessed signals shared by all analysis stages (in dtype),
+            ## input signals are kept as given
+            self.context = RecordingContext(self.acc, self.metadata, self.dtype, self.metadata['dtype_tolerance'])
+            acc = self.context.acc
+            
             ## Detect segments
-            df_walking_bouts = segments_detection(self.acc, self.metadata)
+            df_walking_bouts = segments_detection(acc, self.metadata, self.context)
             
             ## Evaluate quality - Needed for ecg?
-            self.df_walking_bouts_quality = evaluate_segments_quality_ecg(self.acc, self.rr, df_walking_bouts, self.metadata)
+            self.df_walking_bouts_quality = evaluate_segments_quality_ecg(acc, self.rr, df_walking_bouts, self.metadata)
             
             ## Estimate physical activity
-            self.PA_measures = evaluate_physical_activity(self.acc, self.metadata)
+            self.PA_measures = evaluate_physical_activity(acc, self.metadata, self.context)
             
             ## Detect rest segments/ Estimate HRV measures - Write 
-            self.HRV_measures = rest_segments_detection_rr(self.acc, self.rr, self.metadata)
+            self.HRV_measures = rest_segments_detection_rr(acc, self.rr, self.metadata, self.context)
             
             ## Estimate mobility/balance measures
-            self.df_mobility_balance = evaluate_mobility_balance(self.acc, self.df_walking_bouts_quality, self.metadata)
+            self.df_mobility_balance = evaluate_mobility_balance(acc, self.df_walking_bouts_quality, self.metadata, self.context)
             
             ## Estimate response measures - Change
-            self.df_HRR = evaluate_heart_rate_response(self.acc, self.df_walking_bouts_quality, self.metadata)
+            self.df_HRR = evaluate_heart_rate_response(acc, self.df_walking_bouts_quality, self.metadata)
             
             self.analysis_performed_flag = 1
         else:
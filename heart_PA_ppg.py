@@ -20,12 +20,14 @@ from evaluate_segments_quality import evaluate_segments_quality_ppg
 from mobility_balance import evaluate_mobility_balance
 from physical_activity import evaluate_physical_activity
 from heart_rate_response import evaluate_heart_rate_response
+from recording_context import RecordingContext
+from utils import signals_astype
 
 class heart_PA_ppg(object):
     """ Class for evaluation of ppg and acc signals.
     
     """
-    def __init__(self, acc_, ppg_, metadata_):
+    def __init__(self, acc_, ppg_, metadata_, dtype = None):
         ## init metedata
         self.metadata = metadata_
         
@@ -39,6 +41,17 @@ class heart_PA_ppg(object):
         
         ## add default metadata parameters if not specified
         #'position' - ['wrist','chest']
+        #'ppg_resample_method' - ['polyphase','fft']
+        #'acc_orientation_step' - samples between acceleration orientation estimates (None - every sample)
+        #'acc_median_block' - block length of approximate acceleration rolling median (None - exact)
+        self.metadata.setdefault('ppg_resample_method', 'polyphase')
+        self.metadata.setdefault('acc_orientation_step', None)
+        self.metadata.setdefault('acc_median_block', None)
+        #'dtype_tolerance' - relative error of dtype signals checked against float64 (None - no checks)
+        self.metadata.setdefault('dtype_tolerance', None)
+        
+        ## data type of signal arrays (None - as given), timestamps stay float64
+        self.dtype = dtype
 
         ## init signals
         self.acc = acc_
@@ -78,23 +91,34 @@ class heart_PA_ppg(object):
         """
         self.analysis_performed_flag = 0
         if self.signals_present == 1:
+            ## Preprocessed signals shared by all analysis stages (in dtype),
+            ## input signals are kept as given
+            self.context = RecordingContext(self.acc, self.metadata, self.dtype, self.metadata['dtype_tolerance'])
+            acc = self.context.acc
+            ppg = self.ppg
+            if self.dtype is not None:
+                ppg = signals_astype(self.ppg, self.dtype)
+                if self.context.reference is not None:
+                    keys_ppg = [x for x in self.ppg.keys() if 'ppg' in x]
+                    self.context.check_tolerance('ppg', ppg[keys_ppg], self.ppg[keys_ppg])
+            
             ## Detect segments
-            df_walking_bouts = segments_detection(self.acc, self.metadata)
+            df_walking_bouts = segments_detection(acc, self.metadata, self.context)
             
             ## Evaluate quality
-            self.df_walking_bouts_quality = evaluate_segments_quality_ppg(self.acc, self.ppg, df_walking_bouts, self.metadata)
+            self.df_walking_bouts_quality = evaluate_segments_quality_ppg(acc, ppg, df_walking_bouts, self.metadata)
             
             ## Estimate physical activity
-            self.PA_measures = evaluate_physical_activity(self.acc, self.metadata)
+            self.PA_measures = evaluate_physical_activity(acc, self.metadata, self.context)
             
             ## Detect rest segments/ Estimate HRV measures
-            self.HRV_measures = rest_segments_detection(self.acc, self.ppg, self.metadata)
+            self.HRV_measures = rest_segments_detection(acc, ppg, self.metadata, self.context)
             
             ## Estimate mobility/balance measures
-            self.df_mobility_balance = evaluate_mobility_balance(self.acc, self.df_walking_bouts_quality, self.metadata)
+            self.df_mobility_balance = evaluate_mobility_balance(acc, self.df_walking_bouts_quality, self.metadata, self.context)
             
             ## Estimate response measures
-            self.df_HRR = evaluate_heart_rate_response(self.acc, self.df_walking_bouts_quality, self.metadata)
+            self.df_HRR = evaluate_heart_rate_response(acc, self.df_walking_bouts_quality, self.metadata)
             
             self.analysis_performed_flag = 1
         else:
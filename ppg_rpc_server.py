@@ -18,6 +18,9 @@ from gridfs import GridFS
 __location__ = str(os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(os.path.dirname(__file__))))) + "/config.yaml"
 
 logger = get_logger('Heart Dysfunction Monitoring PPG Rabbit MQ', level=logging.DEBUG)
+# data type of acceleration/PPG signal arrays (None - as received, np.float32 halves signal memory)
+SIGNAL_DTYPE = None
+
 log_args = {
     'script': "Heart_Dysfunction_Monitoring_PPG",
     'level': 'ERROR',
@@ -141,9 +144,9 @@ def calculate_heart_PA_ecg(collection_data_j):
     if len(is_chest_there) == len(chest_keys):
         acc_chest = pd.DataFrame({
             'timestamp' : collection_data_j['timestamp_acc_chest'],
-            'x' : collection_data_j['x_chest'],
-            'y' : collection_data_j['y_chest'],
-            'z' : collection_data_j['z_chest']
+            'x' : np.asarray(collection_data_j['x_chest'], dtype = SIGNAL_DTYPE),
+            'y' : np.asarray(collection_data_j['y_chest'], dtype = SIGNAL_DTYPE),
+            'z' : np.asarray(collection_data_j['z_chest'], dtype = SIGNAL_DTYPE)
             }
         )
         rr = pd.DataFrame( { 'timestamp' : collection_data_j['timestamp_rr'],
@@ -151,7 +154,7 @@ def calculate_heart_PA_ecg(collection_data_j):
                        
         try:
             log_args['function'] = 'heart_PA_ecg'
-            ecg_instance = heart_PA_ecg(acc_chest, rr, metadata_ecg)
+            ecg_instance = heart_PA_ecg(acc_chest, rr, metadata_ecg, dtype = SIGNAL_DTYPE)
         except Exception as e:
             Error_msg=f'Error while calculating ECG: {e.__str__()}'
             log_write(pg_conn , description=Error_msg, **log_args)
@@ -206,17 +209,17 @@ def calculate_heart_PA_ppg(collection_data_j):
     if len(is_arm_there) == len(arm_keys):
         acc_arm = pd.DataFrame({
             'timestamp' : collection_data_j['timestamp_acc_arm'],
-            'x' : collection_data_j['x_arm'],
-            'y' : collection_data_j['y_arm'],
-            'z' : collection_data_j['z_arm']
+            'x' : np.asarray(collection_data_j['x_arm'], dtype = SIGNAL_DTYPE),
+            'y' : np.asarray(collection_data_j['y_arm'], dtype = SIGNAL_DTYPE),
+            'z' : np.asarray(collection_data_j['z_arm'], dtype = SIGNAL_DTYPE)
             }
         )
         ppg = pd.DataFrame({ 'timestamp' : collection_data_j['timestamp_ppg'],
-                       'ppg0' : collection_data_j['ppg'] } )
+                       'ppg0' : np.asarray(collection_data_j['ppg'], dtype = SIGNAL_DTYPE) } )
                        
         try:
             log_args['function'] = 'heart_PA_ppg'
-            ppg_instance = heart_PA_ppg(acc_arm, ppg, metadata_ppg)
+            ppg_instance = heart_PA_ppg(acc_arm, ppg, metadata_ppg, dtype = SIGNAL_DTYPE)
         except Exception as e:
             Error_msg=f'Error while calculating PPG: {e.__str__()}'
             log_write(pg_conn , description=Error_msg , **log_args)
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+
+directory = os.path.dirname(__file__)
+sys.path.insert(1, directory + '/../functions/detectors/')
+
+from DigitalFilter import DigitalFilter
+from PPGFrontEnd import B_HP, A_HP, B_LP, A_LP
+
+
+def interleaved(signal, b_coeff, a_coeff, seed):
+    # Filter signal with a random mix of IIRFilter and process_block calls
+    rng = np.random.default_rng(seed)
+    mDigitalFilter = DigitalFilter()
+    output = []
+    start = 0
+    while start < len(signal):
+        if rng.random() < 0.5:
+            output.append(mDigitalFilter.IIRFilter(signal[start], b_coeff, a_coeff))
+            start += 1
+        else:
+            stop = start + int(rng.integers(0, 50))
+            output.extend(mDigitalFilter.process_block(signal[start:stop], b_coeff, a_coeff))
+            start = stop
+    return np.array(output)
+
+
+def test_sample_and_block_calls_are_identical():
+    signal = np.random.default_rng(0).standard_normal(2000).cumsum()
+    alfa = 0.02
+    for b_coeff, a_coeff in [(B_HP, A_HP), (B_LP, A_LP), ([alfa ** 2], [1.0, -2.0 * (1 - alfa), (1 - alfa) ** 2])]:
+        expected = DigitalFilter().process_block(signal, b_coeff, a_coeff)
+        for seed in range(5):
+            assert np.array_equal(interleaved(signal, b_coeff, a_coeff, seed), expected)
+
+
+def test_sample_calls_match_block():
+    signal = np.random.default_rng(1).standard_normal(500)
+    mDigitalFilter = DigitalFilter()
+    output = [mDigitalFilter.IIRFilter(x, B_LP, A_LP) for x in signal]
+    assert np.array_equal(output, DigitalFilter().process_block(signal, B_LP, A_LP))
+
+
+def test_channels_match_single_channel():
+    signals = np.random.default_rng(2).standard_normal((3, 1000))
+    mDigitalFilter = DigitalFilter()
+    output = np.concatenate([mDigitalFilter.process_block(signals[:, :400], B_HP, A_HP),
+                             mDigitalFilter.process_block(signals[:, 400:], B_HP, A_HP)], axis=-1)
+    for signal, output_ch in zip(signals, output):
+        assert np.array_equal(output_ch, DigitalFilter().process_block(signal, B_HP, A_HP))
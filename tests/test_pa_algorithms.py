@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(1, directory + '/../functions/preprocess/')
+
+from PA_algorithms import calc_mad
+
+
+@pytest.fixture
+def acc():
+    return 1000 + 50 * np.random.default_rng(0).standard_normal(50 * 120 + 17)
+
+
+def test_calc_mad_drops_incomplete_second(acc):
+    mads, mean_mad = calc_mad(acc, 50)
+    sec = acc[:50 * 120].reshape(120, 50) / 980.665
+    assert len(mads) == 120
+    np.testing.assert_allclose(mads, np.mean(np.abs(sec - sec.mean(axis=1, keepdims=True)), axis=1), rtol=1e-12)
+    assert mean_mad == np.mean(mads)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.dtype('float32'), 'float32'])
+def test_calc_mad_float32(acc, dtype):
+    expected, expected_mean = calc_mad(acc, 50)
+    mads, mean_mad = calc_mad(acc, 50, dtype=dtype)
+    assert mads.dtype == np.float32
+    np.testing.assert_allclose(mads, expected, rtol=1e-5)
+    np.testing.assert_allclose(mean_mad, expected_mean, rtol=1e-5)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_calc_mad_out(acc, dtype):
+    expected, _ = calc_mad(acc, 50, dtype=dtype)
+    out = np.empty(120, dtype=dtype)
+    mads, _ = calc_mad(acc, 50, out=out, dtype=dtype)
+    assert mads is out
+    assert np.array_equal(out, expected)